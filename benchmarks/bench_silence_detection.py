@@ -0,0 +1,71 @@
+import os, sys
+_SCRIPT_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(_SCRIPT_PATH, ".."))
+from argparse import ArgumentParser
+import tempfile
+import time
+import numpy as np
+
+from smpl_tools.audio_stream import AudioStream, split_by_silence_ts
+
+
+def make_track(duration: float, sample_rate: int = 44100, seed: int = 0)->np.ndarray:
+    # samples of 0.5-4 s separated by 0.5-2 s of a noise floor around -70 dB,
+    # with a short dropout inside the longer samples
+    rng = np.random.default_rng(seed)
+    num_samples = int(duration * sample_rate)
+    track = rng.integers(-10, 10, num_samples).astype(np.int16)
+    position = int(0.3 * sample_rate)
+    while position < num_samples:
+        length = int(rng.uniform(0.5, 4) * sample_rate)
+        sample = rng.integers(-20000, 20000, min(length, num_samples - position)).astype(np.int16)
+        if sample.size > sample_rate:
+            sample[sample_rate // 2:sample_rate // 2 + int(0.2 * sample_rate)] = 0
+        track[position:position + sample.size] = sample
+        position += length + int(rng.uniform(0.5, 2) * sample_rate)
+    return track
+
+
+def time_engine(filename: str, engine: str, min_duration: float, repeat: int, buffer_duration: float):
+    best = float("inf")
+    for _ in range(repeat):
+        stream = AudioStream.from_raw(filename, 44100, 1, buffer_duration=buffer_duration)
+        start = time.perf_counter()
+        slices = split_by_silence_ts(stream, min_duration=min_duration, engine=engine)
+        best = min(best, time.perf_counter() - start)
+    return best, slices
+
+
+def main(argv=None):
+    arg_parser = ArgumentParser(description="Compare silence detection engines on a synthetic track.")
+    arg_parser.add_argument("-t", "--duration", type=float, default=1200, help="Track length in seconds.")
+    arg_parser.add_argument("-s", "--silence_t", type=float, default=0.4)
+    arg_parser.add_argument("-n", "--repeat", type=int, default=5)
+    arg_parser.add_argument("-b", "--buffer", type=float, default=4, help="Read buffer in seconds, as used for file sources.")
+    arg_parser.add_argument("engines", nargs="*", default=["exact", "coarse"])
+    args_namespace = arg_parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = os.path.join(tmp_dir, "track.pcm")
+        make_track(args_namespace.duration).tofile(filename)
+
+        results = {}
+        for engine in args_namespace.engines:
+            elapsed, slices = time_engine(
+                filename,
+                engine,
+                args_namespace.silence_t,
+                args_namespace.repeat,
+                args_namespace.buffer
+            )
+            results[engine] = slices
+            print(f"{engine:>8}: {elapsed*1000:8.1f} ms  {len(slices)} slices")
+
+    reference = results[args_namespace.engines[0]]
+    for engine, slices in results.items():
+        if slices != reference:
+            print(f"{engine} differs from {args_namespace.engines[0]}")
+
+
+if __name__ == "__main__":
+    main()
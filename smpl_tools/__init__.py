@@ -1,9 +1,17 @@
 from . import ffmpeg
 from . import actions 
 from . import audio_stream
+from . import archive
+from . import statistics
+from . import library
+from . import watch
 from .ffmpeg import *
 from .actions import *
 from .audio_stream import *
+from .archive import *
+from .statistics import *
+from .library import *
+from .watch import *
 
 
 
@@ -4,8 +4,17 @@ _SCRIPT_PATH = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(_SCRIPT_PATH, "."))
 from typing import List, Union
 from argparse import ArgumentParser
+import stat
 
 from .actions import split_file_by_silence
+from .actions import split_stream_by_silence
+from .actions import split_stream_by_silence_batch
+from .archive import SampleArchive
+from .audio_stream import AudioStream
+from .ffmpeg import AudioFormat
+from .statistics import write_statistics_sidecar
+from .library import SampleLibrary
+from .watch import WatchFolder
 PACKAGE_NAME = "smpl_tools"
 
 
@@ -13,6 +22,67 @@ class IncorrectInputParameter(Exception):
     pass
 
 
+def _is_streaming_source(source: str)->bool:
+    return source == "-" or stat.S_ISFIFO(os.stat(source).st_mode)
+
+
+def _split_stream(args_namespace, destination):
+    sample_fmt = AudioFormat.from_string(args_namespace.format)
+    if sample_fmt is None or sample_fmt.byte_fmt is not AudioFormat.ByteFormat.SIGNED:
+        raise IncorrectInputParameter(
+            f"Unsupported raw format {args_namespace.format}; use a signed format such as s16le"
+        )
+    stream = AudioStream.from_raw(
+        args_namespace.source,
+        sample_rate     =   args_namespace.rate,
+        num_channels    =   args_namespace.channels,
+        sample_fmt      =   sample_fmt
+    )
+
+    archive = None
+    if args_namespace.archive is not None:
+        archive = SampleArchive(args_namespace.archive, args_namespace.index)
+    try:
+        if args_namespace.batch is not None:
+            if args_namespace.track is None:
+                raise IncorrectInputParameter(
+                    "Parameter --track is required when streaming a batchjob"
+                )
+            if not isinstance(destination, str):
+                raise IncorrectInputParameter(
+                    "Parameter --destination must be a single directory when running a batchjob"
+                )
+            return split_stream_by_silence_batch(
+                stream,
+                args_namespace.batch,
+                args_namespace.track,
+                destination,
+                args_namespace.pattern,
+                archive             =   archive,
+                collect_statistics  =   args_namespace.stats is not None,
+                engine              =   args_namespace.engine
+            )
+        source_name = args_namespace.track
+        if source_name is None:
+            source_name = "stdin" if args_namespace.source == "-" else args_namespace.source
+        return split_stream_by_silence(
+            stream,
+            destination         =   destination,
+            source_name         =   source_name,
+            min_duration        =   args_namespace.silence_t,
+            db_cutoff           =   args_namespace.cutoff,
+            offset_correction   =   args_namespace.offset,
+            archive             =   archive,
+            archive_base_dir    =   destination if isinstance(destination, str) else None,
+            collect_statistics  =   args_namespace.stats is not None,
+            engine              =   args_namespace.engine,
+            db_close_cutoff     =   args_namespace.close
+        )
+    finally:
+        if archive is not None:
+            archive.close()
+
+
 def split_by_silence_cmd(argv: List[str]):
 
 
@@ -28,14 +98,22 @@ def split_by_silence_cmd(argv: List[str]):
         return str_in
 
 
+    def parse_source_string(str_in: str)->str:
+        if str_in == "-":
+            return str_in
+        return parse_file_string(str_in)
+
+
     arg_parser = ArgumentParser(
         add_help=True, 
         prog=f"{PACKAGE_NAME} split_by_silence"
     )
     arg_parser.add_argument(
         "source",
-        metavar = "SOURCE_FILE",          
-        type = parse_file_string
+        metavar = "SOURCE_FILE",
+        help = ("A file or directory, or \"-\" / a FIFO to read raw PCM "
+                "while it is being written (see --format)."),
+        type = parse_source_string
     )
     arg_parser.add_argument(
         "-s",
@@ -54,6 +132,15 @@ def split_by_silence_cmd(argv: List[str]):
         type = parse_as_negative_float,
         default = -60
     )
+    arg_parser.add_argument(
+        "--close",
+        metavar = "CLOSE_CUTOFF_DB",
+        help = ("Optional second cutoff (in decibels, at or below CUTOFF_DB) "
+                "the signal must fall under before it counts as silence "
+                "again. Sound starts at CUTOFF_DB. Default is CUTOFF_DB."),
+        type = parse_as_negative_float,
+        default = None
+    )
     arg_parser.add_argument(
         "-o",
         "--offset",
@@ -88,13 +175,96 @@ def split_by_silence_cmd(argv: List[str]):
         type = str,     
         default = None
     )
+    arg_parser.add_argument(
+        "-a",
+        "--archive",
+        metavar = "ARCHIVE_FILE",
+        help = ("Write every sample into a single .tar or .zip archive "
+                "instead of individual files. Paths inside the archive "
+                "are relative to the destination."),
+        type = str,
+        default = None
+    )
+    arg_parser.add_argument(
+        "--index",
+        help = ("Write ARCHIVE_FILE.index.json containing the byte offset "
+                "of every sample in the archive."),
+        action = "store_true"
+    )
+    arg_parser.add_argument(
+        "--stats",
+        metavar = "STATS_FILE",
+        help = ("Write a json file with the peak, RMS, DC offset, clipped "
+                "sample count and duration of every exported sample."),
+        type = str,
+        default = None
+    )
+    arg_parser.add_argument(
+        "-l",
+        "--library",
+        metavar = "LIBRARY_DB",
+        help = ("Add the exported samples to this sqlite sample library "
+                "(see the query command)."),
+        type = str,
+        default = None
+    )
+    arg_parser.add_argument(
+        "--cd",
+        metavar = "CD_NAME",
+        help = ("Name of the source CD recorded in the sample library. "
+                "Defaults to the name of the batch file."),
+        type = str,
+        default = None
+    )
+    arg_parser.add_argument(
+        "-f",
+        "--format",
+        metavar = "RAW_FORMAT",
+        help = "Sample format of raw PCM read from stdin or a FIFO. Default is s16le.",
+        type = str,
+        default = "s16le"
+    )
+    arg_parser.add_argument(
+        "-r",
+        "--rate",
+        metavar = "SAMPLE_RATE",
+        help = "Sample rate of raw PCM read from stdin or a FIFO. Default is 44100.",
+        type = int,
+        default = 44100
+    )
+    arg_parser.add_argument(
+        "--channels",
+        metavar = "NUM_CHANNELS",
+        help = "Channel count of raw PCM read from stdin or a FIFO. Default is 2.",
+        type = int,
+        default = 2
+    )
+    arg_parser.add_argument(
+        "-t",
+        "--track",
+        metavar = "TRACK_NAME",
+        help = ("Name of the track being streamed. Selects the track "
+                "entry when combined with --batch."),
+        type = str,
+        default = None
+    )
+    arg_parser.add_argument(
+        "--engine",
+        help = ("Silence detection engine. \"coarse\" scans block maxima first "
+                "and only inspects individual samples around candidate "
+                "edges; both give identical results. Default is exact."),
+        choices = ["exact", "coarse"],
+        default = "exact"
+    )
     args_namespace = arg_parser.parse_known_args(argv)[0]
+    collect_statistics = args_namespace.stats is not None
+    streaming = _is_streaming_source(args_namespace.source)
 
     destination: Union[None, List[str], str] = args_namespace.destination
     if destination is not None and not isinstance(destination, str) and len(destination) == 1:
         destination = destination[0]
 
-    if args_namespace.batch is not None:
+    if args_namespace.batch is not None and not streaming:
         if destination is None:
             if os.path.isdir(args_namespace.source):
                 destination = args_namespace.source
@@ -109,16 +279,206 @@ def split_by_silence_cmd(argv: List[str]):
             args_namespace.batch,
             args_namespace.source,
             destination,
-            args_namespace.pattern
+            args_namespace.pattern,
+            archive_filename    =   args_namespace.archive,
+            archive_index       =   args_namespace.index,
+            statistics_filename =   args_namespace.stats,
+            library_filename    =   args_namespace.library,
+            source_cd           =   args_namespace.cd,
+            engine              =   args_namespace.engine
         )
+        return
+
+    if streaming:
+        written = _split_stream(args_namespace, destination)
+    elif args_namespace.archive is not None:
+        if isinstance(destination, str):
+            archive_base_dir = destination
+        else:
+            archive_base_dir = os.path.dirname(args_namespace.source)
+        with SampleArchive(args_namespace.archive, args_namespace.index) as archive:
+            written = split_file_by_silence(
+                args_namespace.source,
+                destination         =   destination,
+                min_duration        =   args_namespace.silence_t,
+                db_cutoff           =   args_namespace.cutoff,
+                offset_correction   =   args_namespace.offset,
+                archive             =   archive,
+                archive_base_dir    =   archive_base_dir,
+                collect_statistics  =   collect_statistics,
+                engine              =   args_namespace.engine,
+                db_close_cutoff     =   args_namespace.close
+            )
     else:
-        split_file_by_silence(
+        written = split_file_by_silence(
             args_namespace.source,
             destination         =   destination,
             min_duration        =   args_namespace.silence_t,
             db_cutoff           =   args_namespace.cutoff,
             offset_correction   =   args_namespace.offset,
+            collect_statistics  =   collect_statistics,
+            engine              =   args_namespace.engine,
+            db_close_cutoff     =   args_namespace.close
+        )
+
+    if collect_statistics:
+        write_statistics_sidecar(args_namespace.stats, written)
+        print(f"Wrote: {args_namespace.stats}")
+
+    if args_namespace.library is not None:
+        source_cd = args_namespace.cd
+        if source_cd is None and args_namespace.batch is not None:
+            source_cd = os.path.splitext(os.path.basename(args_namespace.batch))[0]
+        with SampleLibrary(args_namespace.library) as library:
+            changed = library.upsert(written, source_cd)
+        print(f"Indexed {changed} changed sample(s) in {args_namespace.library}")
+
+
+def watch_cmd(argv: List[str]):
+
+
+    def parse_dir_string(str_in: str)->str:
+        if not os.path.isdir(str_in):
+            raise FileNotFoundError(f"Could not find directory {str_in}.")
+        return str_in
+
+
+    arg_parser = ArgumentParser(
+        add_help=True, 
+        prog=f"{PACKAGE_NAME} watch"
+    )
+    arg_parser.add_argument(
+        "source",
+        metavar = "SOURCE_DIR",
+        help = "One or more directories to watch for new tracks.",
+        type = parse_dir_string,
+        nargs = "+"
+    )
+    arg_parser.add_argument(
+        "-b",
+        "--batch",
+        metavar = "JSON_BATCHJOB",
+        help = ("A json file containing a list of track entries. "
+                "New files are matched to entries by their source filename."),
+        type = str,
+        required = True
+    )
+    arg_parser.add_argument(
+        "-d",
+        "--destination",
+        type = str,     
+        required = True
+    )
+    arg_parser.add_argument(
+        "-p",
+        "--pattern",
+        metavar = "NAMING PATTERN",
+        type = str,     
+        default = None
+    )
+    arg_parser.add_argument(
+        "-j",
+        "--jobs",
+        metavar = "NUM_WORKERS",
+        help = "Number of worker processes. Default is the number of CPUs.",
+        type = int,
+        default = None
+    )
+    arg_parser.add_argument(
+        "--settle",
+        metavar = "SETTLE_TIME",
+        help = ("Seconds a file must remain unchanged before it is "
+                "considered fully written. Default is 2."),
+        type = float,
+        default = 2
+    )
+    arg_parser.add_argument(
+        "-l",
+        "--library",
+        metavar = "LIBRARY_DB",
+        help = "Add the exported samples to this sqlite sample library.",
+        type = str,
+        default = None
+    )
+    arg_parser.add_argument(
+        "--cd",
+        metavar = "CD_NAME",
+        help = ("Name of the source CD recorded in the sample library. "
+                "Defaults to the name of the batch file."),
+        type = str,
+        default = None
+    )
+    args_namespace = arg_parser.parse_known_args(argv)[0]
+
+    watcher = WatchFolder(
+        args_namespace.batch,
+        args_namespace.source,
+        args_namespace.destination,
+        naming_pattern  =   args_namespace.pattern,
+        settle_time     =   args_namespace.settle,
+        num_workers     =   args_namespace.jobs,
+        library_filename=   args_namespace.library,
+        source_cd       =   args_namespace.cd
+    )
+    watcher.run()
+
+
+def query_cmd(argv: List[str]):
+
+
+    def parse_file_string(str_in: str)->str:
+        if not os.path.exists(str_in):
+            raise FileNotFoundError(f"Could not find {str_in}.")
+        return str_in
+
+
+    arg_parser = ArgumentParser(
+        add_help=True, 
+        prog=f"{PACKAGE_NAME} query"
+    )
+    arg_parser.add_argument(
+        "library",
+        metavar = "LIBRARY_DB",
+        type = parse_file_string
+    )
+    arg_parser.add_argument(
+        "text",
+        metavar = "SAMPLE_NAME",
+        help = "Words to search for in sample, track and CD names.",
+        nargs = "+"
+    )
+    arg_parser.add_argument(
+        "--cd",
+        metavar = "CD_NAME",
+        help = "Only return samples from this CD.",
+        type = str,
+        default = None
+    )
+    arg_parser.add_argument(
+        "-e",
+        "--exact",
+        help = "Match the whole sample name (case insensitive).",
+        action = "store_true"
+    )
+    arg_parser.add_argument(
+        "-n",
+        "--limit",
+        metavar = "MAX_RESULTS",
+        type = int,
+        default = 50
+    )
+    args_namespace = arg_parser.parse_known_args(argv)[0]
+
+    with SampleLibrary(args_namespace.library) as library:
+        results = library.query(
+            " ".join(args_namespace.text),
+            source_cd   =   args_namespace.cd,
+            limit       =   args_namespace.limit,
+            exact       =   args_namespace.exact
         )
+    for result in results:
+        print(f"{result['source_cd']} / {result['track']} / {result['sample_name']}: {result['path']}")
+    return results
 
 
 def show_help_cmd(arg_parser: ArgumentParser, argv):
@@ -138,6 +498,8 @@ def main(argv=None):
 
     cmd_funcs = {
         "split_by_silence": split_by_silence_cmd,
+        "watch": watch_cmd,
+        "query": query_cmd,
         "help": lambda x: show_help_cmd(arg_parser, x)
     }
 
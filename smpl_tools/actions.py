@@ -1,103 +1,237 @@
 import os, sys
 _SCRIPT_PATH = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(_SCRIPT_PATH, "."))
-from typing import Any, Dict, List, Union
+from typing import Any, BinaryIO, Dict, List, Tuple, Union
 import json
 import re
+import tempfile
+import wave
+import numpy as np
 
-from . import ffmpeg
+from .archive import SampleArchive, arcname
 from .audio_stream import AudioStream
-from .audio_stream import split_by_silence_ts
+from .audio_stream import iter_silence_slices
+from .statistics import SliceStatistics
+from .statistics import write_statistics_sidecar
+from .library import SampleLibrary
 
 
-def _save_slices(
-    src_filename: str, 
-    slices: List[int], 
-    filenames: List[str],
-    ignore_indices: List[int]
-):
-    
-    for i, start_ts in enumerate(slices):
-        end_ts = None if i + 1 >= len(slices) else slices[i + 1]
-
-        dst_filename = filenames[i]
-        if i not in ignore_indices:
-            ffmpeg.copy_audio_segment(
-                src_filename, 
-                dst_filename, 
-                start_ts, 
-                end_ts
-            )
-            print(f"Wrote: {dst_filename}")
-    return
+_ARCHIVE_SPOOL_SIZE = 2**24     # archive members larger than this are spooled to disk
+_COARSE_FILE_BUFFER_DURATION = 4
 
+def _determine_output_samplename(
+        destination:    Union[str, List[str], None],
+        source_name:    str,
+        index:          int
+)->str:
+    destination = destination or []
+    if not isinstance(destination, str) and index < len(destination):
+        return destination[index]
+
+    basename = os.path.splitext(os.path.basename(source_name))[0] or "stream"
+    if isinstance(destination, str):
+        directory = destination
+    elif len(destination) > 0:
+        directory = os.path.dirname(destination[-1])
+    else:
+        directory = os.path.dirname(source_name)
+    return os.path.join(directory, f"{basename}_{(index+1):02d}.wav")
 
-def _determine_output_samplenames(
-        destination_arg:    Union[str, List[str], None],
-        source_filename:    str,
-        output_files_cnt:   int
-)->List[str]:
 
-    destination_arg = destination_arg or []
+def split_file_by_silence(
+        src_filename: str,
+        destination: Union[str, List[str]] = None,
+        min_duration: float = 0.4,
+        db_cutoff: float = -60,
+        offset_correction: float = 0,
+        ignore_indices: List[int] = None,
+        archive: SampleArchive = None,
+        archive_base_dir: str = None,
+        collect_statistics: bool = False,
+        engine: str = "exact",
+        db_close_cutoff: float = None
+)->List[Dict[str, Any]]:
+    # One decode in the source's own layout feeds detection, statistics and
+    # the written slices alike. A file has no latency to keep low, so the
+    # coarse engine gets long reads that keep numpy busy.
+    buffer_duration = _COARSE_FILE_BUFFER_DURATION if engine == "coarse" else 1
+    return split_stream_by_silence(
+        AudioStream(src_filename, buffer_duration=buffer_duration),
+        destination,
+        source_name=src_filename,
+        min_duration=min_duration,
+        db_cutoff=db_cutoff,
+        offset_correction=offset_correction,
+        ignore_indices=ignore_indices,
+        archive=archive,
+        archive_base_dir=archive_base_dir,
+        collect_statistics=collect_statistics,
+        engine=engine,
+        db_close_cutoff=db_close_cutoff
+    )
+
 
-    if isinstance(destination_arg, str) or len(destination_arg) < output_files_cnt:
-        basename = ".".join(os.path.basename(source_filename).split(".")[:-1])
-        if len(basename) <= 0:
-            basename = source_filename
-        
-        if isinstance(destination_arg, str):
-            dst_filepaths = []
-            r = range(output_files_cnt)
-            directory = destination_arg
-        else:
-            dst_filepaths = destination_arg
-            r = range(len(destination_arg), output_files_cnt)
-            if len(destination_arg) < 1:
-                directory = os.path.dirname(source_filename)
-            else:
-                directory = os.path.dirname(destination_arg[-1])
+class _SliceWriter:
 
-        for i in r:
-            new_name = os.path.join(directory, f"{basename}_{(i+1):02d}.wav")
-            dst_filepaths.append(new_name)
-    else:
-        dst_filepaths = destination_arg
 
-    for dst_filepath in dst_filepaths:  # Ensure every directory exists
-        if dst_filepath is not None and len(dst_filepath) > 0:
-            os.makedirs(os.path.dirname(dst_filepath), exist_ok=True)
+    def __init__(self, num_channels: int) -> None:
+        # Frames go straight into the WAV of the slice they belong to; only
+        # frames a later onset could still claim are held back.
+        self.num_channels = num_channels
+        self.target: wave.Wave_write = None     # frames without a target are dropped
+        self._pending: List[np.ndarray] = []
+        self._position = 0      # frame index of the first pending frame
 
-    return dst_filepaths
 
+    @property
+    def position(self)->int:
+        return self._position
 
-def split_file_by_silence(
-        src_filename: str,
+
+    def feed(self, buffer: np.ndarray):
+        self._pending.append(buffer)
+
+
+    def advance(self, end_ts: int):
+        # write the pending frames before end_ts and forget them
+        while len(self._pending) > 0 and self._position < end_ts:
+            buffer = self._pending[0]
+            split_at = (end_ts - self._position) * self.num_channels
+            if split_at >= buffer.size:
+                frames = self._pending.pop(0)
+            else:
+                frames, self._pending[0] = buffer[:split_at], buffer[split_at:]
+            if self.target is not None:
+                self.target.writeframesraw(frames.tobytes())
+            self._position += frames.size // self.num_channels
+
+
+    def flush(self):
+        while len(self._pending) > 0:
+            self.advance(self._position + self._pending[0].size // self.num_channels)
+
+
+def split_stream_by_silence(
+        stream: AudioStream,
         destination: Union[str, List[str]] = None,
+        source_name: str = "stdin",
         min_duration: float = 0.4,
         db_cutoff: float = -60,
         offset_correction: float = 0,
-        ignore_indices: List[int] = None
-):
-    print(f"Splitting {src_filename}")
+        ignore_indices: List[int] = None,
+        archive: SampleArchive = None,
+        archive_base_dir: str = None,
+        collect_statistics: bool = False,
+        engine: str = "exact",
+        db_close_cutoff: float = None
+)->List[Dict[str, Any]]:
+    # Each slice is written while it is read. Memory use does not grow with
+    # the slice length; archive members are spooled to disk once they get large.
+    print(f"Splitting {source_name}")
     ignore_indices = ignore_indices or []
 
-    # calculate the onset timestamps
-    stream = AudioStream(src_filename)
-    slices = split_by_silence_ts(
-        stream, 
-        min_duration=min_duration,
-        db_cuttoff=db_cutoff,
-        offset_correction=offset_correction
-    )
+    writer = _SliceWriter(stream.num_channels)
+    stream.add_listener(writer.feed)
 
-    dst_filenames = _determine_output_samplenames(
-        destination,
-        src_filename,
-        len(slices)
-    )
+    statistics = None
+    if collect_statistics:
+        statistics = SliceStatistics(
+            full_scale=2**(stream.sample_fmt.bits - 1),
+            sample_rate=stream.sample_rate,
+            num_channels=stream.num_channels
+        )
 
-    _save_slices(src_filename, slices, dst_filenames, ignore_indices)
-    return
+    written: List[Dict[str, Any]] = []
+    created_dirs = set()
+
+    def open_slice(i: int)->Union[Tuple[str, BinaryIO, wave.Wave_write], None]:
+        if i in ignore_indices:
+            return None
+        dst_filename = _determine_output_samplename(destination, source_name, i)
+        if archive is None:
+            directory = os.path.dirname(dst_filename)
+            if len(directory) > 0 and directory not in created_dirs:
+                os.makedirs(directory, exist_ok=True)
+                created_dirs.add(directory)
+            target = open(dst_filename, "wb")
+        else:
+            target = tempfile.SpooledTemporaryFile(max_size=_ARCHIVE_SPOOL_SIZE)
+        wav_file = wave.open(target, "wb")
+        wav_file.setnchannels(stream.num_channels)
+        wav_file.setsampwidth(stream.sample_fmt.num_bytes)
+        wav_file.setframerate(stream.sample_rate)
+        return dst_filename, target, wav_file
+
+    def close_slice(i: int, start_ts: int, end_ts: int, output):
+        if output is None:
+            return
+        dst_filename, target, wav_file = output
+        wav_file.close()
+        record = {
+            "source":   source_name,
+            "index":    i,
+            "start_ts": start_ts,
+            "end_ts":   end_ts
+        }
+        if archive is None:
+            target.close()
+            print(f"Wrote: {dst_filename}")
+            record["path"] = dst_filename
+        else:
+            member_name = arcname(dst_filename, archive_base_dir)
+            record["sha1"] = archive.add_file(member_name, target)
+            target.close()
+            print(f"Wrote: {archive.archive_filename}:{member_name}")
+            record["path"] = member_name
+            record["archive"] = archive.archive_filename
+            record["size"] = archive.index[member_name][1]
+        written.append(record)
+
+    def discard_slice(output):
+        # a slice cut short by a failed read must not be left behind looking complete
+        dst_filename, target, wav_file = output
+        try:
+            wav_file.close()
+        finally:
+            target.close()
+            if archive is None:
+                os.remove(dst_filename)
+
+    index = -1
+    start_ts = 0
+    output = None
+    with stream:
+        try:
+            for slice_ts in iter_silence_slices(
+                stream,
+                min_duration=min_duration,
+                db_cuttoff=db_cutoff,
+                offset_correction=offset_correction,
+                statistics=statistics,
+                engine=engine,
+                db_close_cuttoff=db_close_cutoff,
+                on_advance=writer.advance
+            ):
+                writer.advance(slice_ts)
+                if index >= 0:
+                    close_slice(index, start_ts, slice_ts, output)
+                index += 1
+                start_ts = slice_ts
+                output = open_slice(index)
+                writer.target = None if output is None else output[2]
+            writer.flush()
+        except BaseException:
+            if output is not None:
+                discard_slice(output)
+            raise
+        if index >= 0:
+            close_slice(index, start_ts, writer.position, output)
+
+    if statistics is not None:
+        slice_statistics = {s["start_ts"]: s for s in statistics.finish()}
+        for record in written:
+            record.update(slice_statistics.get(record["start_ts"], {}))
+    return written
 
 
 _REGEX_NAMING_PATTERN = re.compile(r"\%\((\w+)\)")
@@ -149,55 +283,98 @@ def _process_naming_pattern(
     
 
 
-def _split_file_by_silence_batch(
-        entries:            List[Dict[str, Any]],
-        source_dir:         str,
+def _batch_entry_destinations(
+        entry:              Dict[str, Any],
         naming_pattern:     str
 ):
-    
-    for entry in entries:
-        filenames = entry.get("sample_names", [])
-        to_remove: List[int] = []
-        for i, filename in enumerate(filenames):
-            if filename is None:
-                to_remove.append(i)
-        
-        # Check extension
-        filename_in: str = entry["source"]
-        tokens = filename_in.split(".")
-        if len(tokens) < 1 or len(tokens[-1]) > 6:
-            filename = ".".join([filename_in, "wav"])
+    filenames = entry.get("sample_names", [])
+    to_remove: List[int] = []
+    for i, filename in enumerate(filenames):
+        if filename is None:
+            to_remove.append(i)
+
+    def make_filename(filename):
+        if filename is not None:
+            return _process_naming_pattern(naming_pattern, filename, entry["source"])
         else:
-            filename = filename_in
+            return ""
+    destinations = [make_filename(filename) for filename in filenames]
+    return destinations, to_remove
+
+
+def _split_batch_entry(
+        entry:              Dict[str, Any],
+        source_dir:         str,
+        naming_pattern:     str,
+        archive:            SampleArchive = None,
+        archive_base_dir:   str = None,
+        collect_statistics: bool = False,
+        engine:             str = "exact",
+        source_path:        str = None
+)->List[Dict[str, Any]]:
+    filenames = entry.get("sample_names", [])
+    destinations, to_remove = _batch_entry_destinations(entry, naming_pattern)
+    
+    # Check extension
+    filename_in: str = entry["source"]
+    tokens = filename_in.split(".")
+    if len(tokens) < 1 or len(tokens[-1]) > 6:
+        filename = ".".join([filename_in, "wav"])
+    else:
+        filename = filename_in
 
+    if source_path is None:
         source_path = os.path.join(source_dir, entry["source"])
-        def make_filename(filename):
-            if filename is not None:
-                return _process_naming_pattern(naming_pattern, filename, entry["source"])
-            else:
-                return ""
-        destinations = [make_filename(filename) for filename in filenames]
-        min_duration = entry.get("silence", 0.4)
-        db_cutoff = entry.get("amplitude", -60)
-
-        split_file_by_silence(
-            source_path,
-            destinations,
-            min_duration=min_duration,
-            db_cutoff=db_cutoff,
-            ignore_indices=to_remove
-        )
+    min_duration = entry.get("silence", 0.4)
+    db_cutoff = entry.get("amplitude", -60)
+    db_close_cutoff = entry.get("close_amplitude", None)
 
+    written = split_file_by_silence(
+        source_path,
+        destinations,
+        min_duration=min_duration,
+        db_cutoff=db_cutoff,
+        ignore_indices=to_remove,
+        archive=archive,
+        archive_base_dir=archive_base_dir,
+        collect_statistics=collect_statistics,
+        engine=engine,
+        db_close_cutoff=db_close_cutoff
+    )
+    for record in written:
+        record["track"] = entry["source"]
+        if record["index"] < len(filenames):
+            record["sample_name"] = filenames[record["index"]]
+    return written
 
-def split_file_by_silence_batch(
-        batch_filename:     str,
+
+def _split_file_by_silence_batch(
+        entries:            List[Dict[str, Any]],
         source_dir:         str,
-        destination_dir:    str,
-        naming_pattern:     str = None
-):
-    source_dir = source_dir
-    destination_dir = destination_dir
-    naming_pattern = naming_pattern or "%(dst)/%(smpl).wav"
+        naming_pattern:     str,
+        archive:            SampleArchive = None,
+        archive_base_dir:   str = None,
+        collect_statistics: bool = False,
+        engine:             str = "exact"
+)->List[Dict[str, Any]]:
+    
+    written = []
+    for entry in entries:
+        written += _split_batch_entry(
+            entry, 
+            source_dir, 
+            naming_pattern,
+            archive=archive,
+            archive_base_dir=archive_base_dir,
+            collect_statistics=collect_statistics,
+            engine=engine
+        )
+    return written
+
+
+def _load_batch_entries(
+        batch_filename:     str
+)->List[Dict[str, Any]]:
 
     with open(batch_filename, "r") as json_file:
         json_data = json.load(json_file)
@@ -206,22 +383,123 @@ def split_file_by_silence_batch(
             entries = json_data
         else:
             entries = json_data.get("entries", [])
-    
+    return entries
+
+
+def _resolve_naming_pattern(
+        naming_pattern:     Union[str, None],
+        destination_dir:    str
+)->str:
+
+    naming_pattern = naming_pattern or "%(dst)/%(smpl).wav"
     naming_pattern = naming_pattern.replace(
         "%(dst)", 
         destination_dir
     )
+    return naming_pattern
 
-    _split_file_by_silence_batch(
-        entries,
-        source_dir,
-        naming_pattern
-    )
+
+def split_file_by_silence_batch(
+        batch_filename:     str,
+        source_dir:         str,
+        destination_dir:    str,
+        naming_pattern:     str = None,
+        archive_filename:   str = None,
+        archive_index:      bool = False,
+        statistics_filename: str = None,
+        library_filename:   str = None,
+        source_cd:          str = None,
+        engine:             str = "exact"
+)->List[Dict[str, Any]]:
+    entries = _load_batch_entries(batch_filename)
+    naming_pattern = _resolve_naming_pattern(naming_pattern, destination_dir)
+    collect_statistics = statistics_filename is not None
+
+    if archive_filename is None:
+        written = _split_file_by_silence_batch(
+            entries,
+            source_dir,
+            naming_pattern,
+            collect_statistics=collect_statistics,
+            engine=engine
+        )
+    else:
+        with SampleArchive(archive_filename, write_index=archive_index) as archive:
+            written = _split_file_by_silence_batch(
+                entries,
+                source_dir,
+                naming_pattern,
+                archive=archive,
+                archive_base_dir=destination_dir,
+                collect_statistics=collect_statistics,
+                engine=engine
+            )
+
+    if collect_statistics:
+        write_statistics_sidecar(statistics_filename, written)
+        print(f"Wrote: {statistics_filename}")
+
+    if library_filename is not None:
+        if source_cd is None:
+            source_cd = os.path.splitext(os.path.basename(batch_filename))[0]
+        with SampleLibrary(library_filename) as library:
+            changed = library.upsert(written, source_cd)
+        print(f"Indexed {changed} changed sample(s) in {library_filename}")
+    return written
         
     
 
 
+def split_stream_by_silence_batch(
+        stream:             AudioStream,
+        batch_filename:     str,
+        track_name:         str,
+        destination_dir:    str,
+        naming_pattern:     str = None,
+        archive:            SampleArchive = None,
+        collect_statistics: bool = False,
+        engine:             str = "exact"
+)->List[Dict[str, Any]]:
+    entries = _load_batch_entries(batch_filename)
+    naming_pattern = _resolve_naming_pattern(naming_pattern, destination_dir)
+
+    def track_key(name: str)->str:
+        name = name.strip().lower()
+        return name[:-4] if name.endswith(".wav") else name
+
+    matches = [
+        entry for entry in entries 
+        if track_key(entry["source"]) == track_key(track_name)
+    ]
+    if len(matches) < 1:
+        raise KeyError(f"No entry for track {track_name} in {batch_filename}.")
+    entry = matches[0]
+
+    filenames = entry.get("sample_names", [])
+    destinations, to_remove = _batch_entry_destinations(entry, naming_pattern)
+    written = split_stream_by_silence(
+        stream,
+        destinations,
+        source_name=entry["source"],
+        min_duration=entry.get("silence", 0.4),
+        db_cutoff=entry.get("amplitude", -60),
+        ignore_indices=to_remove,
+        archive=archive,
+        archive_base_dir=destination_dir,
+        collect_statistics=collect_statistics,
+        engine=engine,
+        db_close_cutoff=entry.get("close_amplitude", None)
+    )
+    for record in written:
+        record["track"] = entry["source"]
+        if record["index"] < len(filenames):
+            record["sample_name"] = filenames[record["index"]]
+    return written
+
+
 __all__ = [
     "split_file_by_silence", 
-    "split_file_by_silence_batch"
+    "split_file_by_silence_batch",
+    "split_stream_by_silence",
+    "split_stream_by_silence_batch"
 ]
\ No newline at end of file
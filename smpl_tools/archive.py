@@ -0,0 +1,167 @@
+import os, sys
+_SCRIPT_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(_SCRIPT_PATH, "."))
+from typing import BinaryIO, Dict, Tuple, Union
+import hashlib
+import io
+import json
+import shutil
+import tarfile
+import time
+import wave
+import zipfile
+
+
+class UnsupportedArchiveFormat(Exception):
+    pass
+
+
+INDEX_SUFFIX = ".index.json"
+
+_COPY_BLOCK_SIZE = 2**20
+
+
+def _archive_kind(archive_filename: str)->str:
+    lowered = archive_filename.lower()
+    if lowered.endswith(".zip"):
+        return "zip"
+    if lowered.endswith(".tar"):
+        return "tar"
+    raise UnsupportedArchiveFormat(
+        f"Cannot write {archive_filename}; archives must end in .tar or .zip"
+    )
+
+
+def pcm_to_wav(
+        pcm: bytes,
+        sample_rate: int = 44100,
+        num_channels: int = 2,
+        sample_width: int = 2
+)->bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav_file:
+        wav_file.setnchannels(num_channels)
+        wav_file.setsampwidth(sample_width)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def arcname(path: str, base_dir: str = None)->str:
+    if base_dir:
+        relative = os.path.relpath(path, base_dir)
+        if not relative.startswith(os.pardir):
+            path = relative
+    path = os.path.splitdrive(os.path.normpath(path))[1]
+    return path.replace(os.sep, "/").lstrip("/")
+
+
+class SampleArchive:
+
+
+    def __init__(
+            self,
+            archive_filename: str,
+            write_index: bool = False
+    ) -> None:
+        self.archive_filename = archive_filename
+        self.write_index = write_index
+        self._kind = _archive_kind(archive_filename)
+        self._index: Dict[str, Tuple[int, int]] = {}
+
+        directory = os.path.dirname(archive_filename)
+        if len(directory) > 0:
+            os.makedirs(directory, exist_ok=True)
+
+        if self._kind == "zip":
+            # stored (uncompressed) so members can be read straight from the index
+            self._archive = zipfile.ZipFile(archive_filename, "w", zipfile.ZIP_STORED)
+        else:
+            self._archive = tarfile.open(archive_filename, "w", format=tarfile.PAX_FORMAT)
+
+
+    @property
+    def index(self)->Dict[str, Tuple[int, int]]:
+        return dict(self._index)
+
+
+    def add(self, name: str, data: bytes)->str:
+        # returns the member's sha1; it cannot be hashed from a path later on
+        return self.add_file(name, io.BytesIO(data))
+
+
+    def add_file(self, name: str, fileobj: BinaryIO)->str:
+        # copies a seekable file object into the archive without loading it whole
+        digest = hashlib.sha1()
+        fileobj.seek(0)
+        for block in iter(lambda: fileobj.read(_COPY_BLOCK_SIZE), b""):
+            digest.update(block)
+        size = fileobj.tell()
+        fileobj.seek(0)
+
+        if self._kind == "zip":
+            info = zipfile.ZipInfo(name, time.localtime()[:6])
+            info.file_size = size
+            with self._archive.open(info, "w") as member:
+                shutil.copyfileobj(fileobj, member, _COPY_BLOCK_SIZE)
+            data_offset = self._archive.fp.tell() - size
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = size
+            info.mtime = int(time.time())
+            self._archive.addfile(info, fileobj)
+            padded_size = -(-size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+            data_offset = self._archive.offset - padded_size
+        self._index[name] = (data_offset, size)
+        return digest.hexdigest()
+
+
+    def close(self):
+        if self._archive is None:
+            return
+        self._archive.close()
+        self._archive = None
+        if self.write_index:
+            with open(self.archive_filename + INDEX_SUFFIX, "w") as json_file:
+                json.dump({
+                    "archive": os.path.basename(self.archive_filename),
+                    "members": {
+                        name: {"offset": offset, "size": size}
+                        for name, (offset, size) in self._index.items()
+                    }
+                }, json_file, indent=2)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def load_index(archive_filename: str)->Dict[str, Tuple[int, int]]:
+    with open(archive_filename + INDEX_SUFFIX, "r") as json_file:
+        json_data = json.load(json_file)
+    members = json_data.get("members", {})
+    return {name: (int(m["offset"]), int(m["size"])) for name, m in members.items()}
+
+
+def read_sample(
+        archive_filename: str,
+        name: str,
+        index: Union[Dict[str, Tuple[int, int]], None] = None
+)->bytes:
+    index = index if index is not None else load_index(archive_filename)
+    offset, size = index[name]
+    with open(archive_filename, "rb") as archive_file:
+        archive_file.seek(offset)
+        return archive_file.read(size)
+
+
+__all__ = [
+    "UnsupportedArchiveFormat",
+    "SampleArchive",
+    "load_index",
+    "read_sample"
+]
@@ -1,11 +1,36 @@
 import os, sys
 _SCRIPT_PATH = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(_SCRIPT_PATH, "."))
-from typing import Any, Dict, List
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Union
 import numpy as np
 
 from . import ffmpeg
 from .ffmpeg import AudioFormat
+from .statistics import SliceStatistics
+
+
+class RawPcmReader:
+
+
+    def __init__(self, file_obj: BinaryIO, close_file: bool = True) -> None:
+        self._file = file_obj
+        self._close_file = close_file
+
+
+    @property
+    def closed(self)->bool:
+        return self._file is None
+
+
+    def read(self, size: int = -1)->bytes:
+        return self._file.read(size)
+
+
+    def close(self, check: bool = True):
+        if self._file is not None:
+            file_obj, self._file = self._file, None
+            if self._close_file:
+                file_obj.close()
 
 
 class AudioStream:
@@ -14,26 +39,63 @@ class AudioStream:
     def __init__(
             self,
             src: str,
-            sample_rate: int = 44100,
-            num_channels: int = 1,
+            sample_rate: int = None,
+            num_channels: int = None,
             out_format: AudioFormat = None, 
             codec: str = "pcm_s16le",
             buffer_duration: float = 1
     ) -> None:
         metadata = ffmpeg.get_metadata(src)
         self._parse_metadata(metadata)
+        # decode in the source's own rate and channel layout unless told otherwise
         self.sample_rate = sample_rate or self.sample_rate
-        self.num_channels = num_channels or num_channels
+        self.num_channels = num_channels or self.in_num_channels
         self._pipe = ffmpeg.open_stream(
             src, 
             codec=codec,
             sampling_rate=self.sample_rate, 
-            num_channels=num_channels,
+            num_channels=self.num_channels,
             out_format=out_format
         )
         self.sample_fmt = out_format or AudioFormat()
         self.buffer_duration = buffer_duration
-    
+        self._listeners: List[Callable[[np.ndarray], None]] = []
+
+
+    @classmethod
+    def from_raw(
+            cls,
+            src: str,
+            sample_rate: int = 44100,
+            num_channels: int = 2,
+            sample_fmt: AudioFormat = None,
+            buffer_duration: float = 1
+    )->'AudioStream':
+        # Raw interleaved PCM from stdin ("-") or a FIFO; nothing can be probed
+        # up front, so the layout has to be supplied by the caller.
+        if src == "-":
+            pipe = RawPcmReader(sys.stdin.buffer, close_file=False)
+        else:
+            pipe = RawPcmReader(open(src, "rb"))
+
+        stream = cls.__new__(cls)
+        stream.sample_rate          = sample_rate
+        stream.num_channels         = num_channels
+        stream.in_num_channels      = num_channels
+        stream.sample_fmt           = sample_fmt or AudioFormat()
+        stream.in_sample_fmt        = stream.sample_fmt
+        stream.bits_per_sample      = stream.sample_fmt.bits
+        stream.duration_ts          = 0
+        stream._pipe                = pipe
+        stream._listeners           = []
+        stream.buffer_duration      = buffer_duration
+        return stream
+
+
+    def add_listener(self, listener: Callable[[np.ndarray], None]):
+        # listeners receive every buffer read, before it is returned to the caller
+        self._listeners.append(listener)
+
 
     @property
     def buffer_duration(self):
@@ -44,7 +106,7 @@ class AudioStream:
     def buffer_duration(self, buffer_duration):
         self._buffer_duration   = buffer_duration
         self._buffer_ts         = int(np.ceil(buffer_duration * self.sample_rate))
-        self._buffer_size       = self._buffer_ts * self.sample_fmt.num_bytes
+        self._buffer_size       = self._buffer_ts * self.sample_fmt.num_bytes * self.num_channels
 
 
     @property
@@ -64,23 +126,54 @@ class AudioStream:
         self.bits_per_sample    = int(primary_data.get("bits_per_smaple", 16))
         self.duration_ts        = int(primary_data.get("duration_ts", 0))
         self.num_channels       = int(primary_data.get("channels", 2))
+        self.in_num_channels    = self.num_channels
         
         smaple_fmt_raw          = primary_data.get("sample_fmt", "s16le")
         self.in_sample_fmt      = AudioFormat.from_string(smaple_fmt_raw)
 
 
+    @property
+    def closed(self)->bool:
+        return self._pipe is None or self._pipe.closed
+
+
+    def close(self):
+        if self._pipe is not None:
+            pipe, self._pipe = self._pipe, None
+            pipe.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._pipe is not None:
+            pipe, self._pipe = self._pipe, None
+            pipe.close(check=exc_type is None)
+
+
     def _get_next(self)->np.ndarray:
-        if not self._pipe or not self._pipe.stdout:
+        if self.closed:
             raise StopIteration
         
-        raw_data = self._pipe.stdout.read(self._buffer_size)
+        raw_data = self._pipe.read(self._buffer_size)
         if not raw_data:
+            # reap ffmpeg as soon as the stream is exhausted; raises on failure
+            self.close()
             raise StopIteration
+
+        frame_size = self.sample_fmt.num_bytes * self.num_channels
+        if len(raw_data) % frame_size != 0:
+            # a truncated final frame can only come from a raw pipe; drop it
+            raw_data = raw_data[:len(raw_data) - len(raw_data) % frame_size]
         
         arr_data = np.frombuffer(
             raw_data, 
             dtype = self.sample_fmt.to_numpy_dtype_str()
         )
+        for listener in self._listeners:
+            listener(arr_data)
         
         return arr_data
 
@@ -93,110 +186,287 @@ class AudioStream:
         return self
 
 
-def split_by_silence_ts(
+class SilenceDetector:
+
+
+    def __init__(
+            self,
+            min_silence_ts: int,
+            open_level: float,
+            close_level: float = None
+    ) -> None:
+        # Sound starts at a sample reaching open_level and silence at a sample
+        # below close_level; anything in between keeps the previous state.
+        # Only the current state and the start of the current silent run are
+        # kept between buffers, so any buffer size gives the same slices.
+        close_level = open_level if close_level is None else close_level
+        if close_level > open_level:
+            raise ValueError("close_level must not exceed open_level.")
+        self.min_silence_ts = min_silence_ts
+        self.open_level = open_level
+        self.close_level = close_level
+
+        self._position = 0
+        self._loud = False
+        # the track is treated as if preceded by silence, so its first onset is always a slice
+        self._run_start = -(min_silence_ts + 1)
+
+
+    @property
+    def position(self)->int:
+        return self._position
+
+
+    def _loud_states(self, samples: np.ndarray)->np.ndarray:
+        # compare against +/- level rather than abs(), which overflows for the most negative integer
+        opens = (samples >= self.open_level) | (samples <= -self.open_level)
+        if self.close_level == self.open_level:
+            return opens
+        closes = (samples < self.close_level) & (samples > -self.close_level)
+
+        # forward-fill the last decisive sample over the samples in between
+        decisive = opens | closes
+        last_decisive = np.where(decisive, np.arange(samples.size), -1)
+        np.maximum.accumulate(last_decisive, out=last_decisive)
+        states = opens[np.maximum(last_decisive, 0)]
+        states[last_decisive < 0] = self._loud
+        return states
+
+
+    def feed(self, samples: np.ndarray)->List[int]:
+        if samples.size == 0:
+            return []
+        states = self._loud_states(samples)
+        previous = np.empty_like(states)
+        previous[0] = self._loud
+        previous[1:] = states[:-1]
+
+        onsets = np.flatnonzero(states & ~previous) + self._position
+        run_starts = np.flatnonzero(~states & previous) + self._position
+
+        # edges alternate, so each onset pairs with the run start before it
+        if not self._loud:
+            run_starts = np.concatenate(([self._run_start], run_starts))
+        paired = run_starts[:onsets.size]
+        slices = onsets[onsets - paired > self.min_silence_ts].tolist()
+
+        if run_starts.size > onsets.size:
+            self._run_start = int(run_starts[-1])
+        self._loud = bool(states[-1])
+        self._position += samples.size
+        return slices
+
+
+    def finish(self)->List[int]:
+        return []
+
+
+class CoarseSilenceDetector:
+
+
+    def __init__(
+            self,
+            min_silence_ts: int,
+            cuttoff_level: float,
+            block_size: int = 256
+    ) -> None:
+        # A silent run longer than min_silence_ts always covers at least one whole
+        # block as long as 2 * block_size - 2 <= min_silence_ts, so scanning the
+        # block maxima can never miss a qualifying run.
+        self.min_silence_ts = min_silence_ts
+        self.cuttoff_level = cuttoff_level
+        self.block_size = max(1, min(block_size, (min_silence_ts + 2) // 2))
+
+        self._carry = np.zeros(0)
+        self._position = 0          # absolute index of the first carried sample
+        # the track is treated as if preceded by silence, so its first onset is always a slice
+        self._run_start = -(min_silence_ts + 1)
+        self._last_block_silent = True
+
+
+    @property
+    def position(self)->int:
+        return self._position
+
+
+    def _is_loud(self, samples: np.ndarray)->np.ndarray:
+        return (samples >= self.cuttoff_level) | (samples <= -self.cuttoff_level)
+
+
+    def _process_blocks(self, samples: np.ndarray, base: int, num_blocks: int, block_size: int)->List[int]:
+        blocks = samples[:num_blocks * block_size].reshape(num_blocks, block_size)
+        silent = (blocks.max(axis=1) < self.cuttoff_level) & (blocks.min(axis=1) > -self.cuttoff_level)
+
+        def first_loud(j):
+            return base + j * block_size + int(np.argmax(self._is_loud(blocks[j])))
+
+        def silence_after(j):
+            last_loud = block_size - 1 - int(np.argmax(self._is_loud(blocks[j][::-1])))
+            return base + j * block_size + last_loud + 1
+
+        slices = []
+        previous_silent = np.concatenate(([self._last_block_silent], silent[:-1]))
+        loud_after_silence = np.flatnonzero(~silent & previous_silent)
+        loud_before_silence = np.flatnonzero(~silent & np.append(silent[1:], True))
+
+        # pair each onset candidate with the loud block that precedes its silent run
+        k = 0
+        run_start = self._run_start
+        for j in loud_after_silence:
+            while k < loud_before_silence.size and loud_before_silence[k] < j:
+                run_start = silence_after(loud_before_silence[k])
+                k += 1
+            onset = first_loud(j)
+            if onset - run_start > self.min_silence_ts:
+                slices.append(onset)
+        while k < loud_before_silence.size:
+            run_start = silence_after(loud_before_silence[k])
+            k += 1
+
+        self._run_start = run_start
+        self._last_block_silent = bool(silent[-1])
+        return slices
+
+
+    def feed(self, samples: np.ndarray)->List[int]:
+        slices = []
+        if self._carry.size > 0:
+            # complete the carried block without copying the whole buffer
+            head_size = self.block_size - self._carry.size
+            head = np.concatenate((self._carry, samples[:head_size]))
+            samples = samples[head_size:]
+            self._carry = head
+            if head.size < self.block_size:
+                return slices
+            slices += self._process_blocks(head, self._position, 1, self.block_size)
+            self._position += self.block_size
+
+        num_blocks = samples.size // self.block_size
+        if num_blocks > 0:
+            slices += self._process_blocks(samples, self._position, num_blocks, self.block_size)
+        processed = num_blocks * self.block_size
+        self._carry = samples[processed:]
+        self._position += processed
+        return slices
+
+
+    def finish(self)->List[int]:
+        # the trailing partial block is its own (shorter) block
+        carry, self._carry = self._carry, np.zeros(0)
+        if carry.size == 0:
+            return []
+        slices = self._process_blocks(carry, self._position, 1, carry.size)
+        self._position += carry.size
+        return slices
+
+
+def _peak_samples(chunk: np.ndarray, num_channels: int)->np.ndarray:
+    # The sample with the largest magnitude in each interleaved frame, sign
+    # kept. Unlike a downmix, out-of-phase channels cannot cancel each other.
+    if num_channels == 1:
+        return chunk
+    frames = chunk.reshape(-1, num_channels)
+    highest = frames.max(axis=1)
+    lowest = frames.min(axis=1)
+    # summed in float64 so that negating the most negative integer cannot overflow
+    return np.where(np.add(highest, lowest, dtype=np.float64) >= 0, highest, lowest)
+
+
+def _iter_detector_slices(
+        stream: AudioStream,
+        detector: Union[SilenceDetector, CoarseSilenceDetector],
+        offset_correction_samples: int,
+        statistics: SliceStatistics = None,
+        on_advance: Callable[[int], None] = None
+)->Iterator[int]:
+    last_slice = -1
+
+    def emit(new_slices):
+        nonlocal last_slice
+        corrected = []
+        for slice_ts in new_slices:
+            slice_ts = max(0, slice_ts - offset_correction_samples)
+            if slice_ts > last_slice:
+                corrected.append(slice_ts)
+                last_slice = slice_ts
+        if statistics is not None:
+            statistics.add_boundaries(corrected)
+        return corrected
+
+    for chunk in stream:
+        if statistics is not None:
+            statistics.feed(chunk)
+        yield from emit(detector.feed(_peak_samples(chunk, stream.num_channels)))
+        # no later slice can start before this point
+        watermark = detector.position - offset_correction_samples
+        if statistics is not None:
+            statistics.advance(watermark)
+        if on_advance is not None:
+            on_advance(watermark)
+    yield from emit(detector.finish())
+
+
+def iter_silence_slices(
         stream: AudioStream,
         min_duration: float = 1,
         db_cuttoff: float = -60,
-        offset_correction: float = 0
-):
+        offset_correction: float = 0,
+        statistics: SliceStatistics = None,
+        engine: str = "exact",
+        db_close_cuttoff: float = None,
+        on_advance: Callable[[int], None] = None
+)->Iterator[int]:
     
     f_scale = stream.sample_fmt.get_normalization_function() 
     cuttoff_level = 10**(db_cuttoff/20) / f_scale(1) # dividing by the scale early wont work for unsigned streams
-
-    stream.buffer_duration = min_duration
-    chunk_size = stream.buffer_ts
-    chunk_half_size = int(np.ceil(chunk_size / 2))
+    close_level = None
+    if db_close_cuttoff is not None:
+        close_level = 10**(db_close_cuttoff/20) / f_scale(1)
+    min_silence_ts = int(np.ceil(min_duration * stream.sample_rate))
     offset_correction_samples = int(np.ceil(offset_correction * stream.sample_rate))
 
-    def chunks_contain_silence(chunk_current, chunk_previous):
-        # divide chunk into 4 partitions
-        partitions = []
-        if chunk_half_size < chunk_previous.size:
-            partitions.append(chunk_previous[:chunk_half_size-1])
-            partitions.append(chunk_previous[chunk_half_size:])
-        if chunk_half_size < chunk_current.size:
-            partitions.append(chunk_current[:chunk_half_size-1])
-            partitions.append(chunk_current[chunk_half_size:])
-        if len(partitions) > 0:
-            predicate = list(map(lambda x: np.max(x) < cuttoff_level, partitions))
-            return any(predicate)
-        return True
-
-    offset_to_base = 0
-    carry_flag = True
-    
-    slices: List[int] = list()
-
-    # read first chunk
-    chunk_previous = np.abs(next(stream))    
-
-    # determine first slice
-    if chunk_previous.size > 0 and chunk_previous[0] >= cuttoff_level:
-        slices.append(0)
-
-    # process chunks
-    for chunk_raw in stream:
-        chunk_current = np.abs(chunk_raw)
-        # chunk has sufficient silence or is part of a caryover 
-        if chunks_contain_silence(chunk_previous, chunk_current) or carry_flag:
-            chunk_full = np.concatenate([chunk_previous, chunk_current])
-            chunk_pred = np.less(chunk_full, cuttoff_level).view(np.int8)
-            chunk_diff = np.diff(chunk_pred)
-
-            # find edges
-            edge_indices = np.where(np.abs(chunk_diff) == 1)[0]
-            if edge_indices.size > 0:
-
-                new_slices = []
-
-                # is first edge a falling edge?
-                if chunk_diff[edge_indices[0]] < 0: 
-                    # was this part of a carryover?
-                    if carry_flag:
-                        new_slices.append(int(edge_indices[0]))
-                        carry_flag = False
-                    # remove initial falling edge
-                    edge_indices = edge_indices[1:]
-                
-                carrying_override = False
-                # is the final edge a rising edge?
-                if (int(edge_indices.size) % 2) == 1: 
-                    # final rising edge was on the left
-                    # half of the chunk, therefore
-                    # sufficient silence has been detected
-                    if edge_indices[-1] < chunk_size:
-                        # initiate caryover
-                        carrying_override = True
-                        carry_flag = True
-                    # remove the final rising edge
-                    edge_indices = edge_indices[0:-1]
-
-                n = int(edge_indices.size / 2) # number of rising/falling edge pairs
-                edge_indices = edge_indices.reshape((2, n), order='F')
-                pulse_widths = np.diff(edge_indices, axis=0).reshape(n) # widths of each pulse
-                valid_pulses = np.greater(pulse_widths, chunk_size).view(np.int8)
-
-                num_valid_pulses = np.sum(valid_pulses)
-                if num_valid_pulses > 0:
-                    # reset the caryflag if override not set
-                    if not carrying_override:
-                        carry_flag = False
-
-                    new_slices += [int(edge_indices[1][i]) for i in range(valid_pulses.size) if valid_pulses[i]]
-
-                if len(new_slices) > 0:
-                    np_new_slices = np.asarray(new_slices) + 1 + offset_to_base - offset_correction_samples
-                    np_new_slices[np_new_slices < 0] = 0
-                    np_new_slices = np.unique(np_new_slices)
-                    slices += np_new_slices.tolist()
-                
-        offset_to_base += chunk_size
-        chunk_previous = chunk_current
-
-    return slices
+    if engine == "exact":
+        detector = SilenceDetector(min_silence_ts, cuttoff_level, close_level)
+    elif engine == "coarse":
+        if close_level is not None and close_level != cuttoff_level:
+            raise ValueError("The coarse engine does not support a separate close cutoff.")
+        detector = CoarseSilenceDetector(min_silence_ts, cuttoff_level)
+    else:
+        raise ValueError(f"Unknown silence detection engine {engine}.")
+
+    yield from _iter_detector_slices(
+        stream,
+        detector,
+        offset_correction_samples,
+        statistics,
+        on_advance
+    )
+
+
+def split_by_silence_ts(
+        stream: AudioStream,
+        min_duration: float = 1,
+        db_cuttoff: float = -60,
+        offset_correction: float = 0,
+        statistics: SliceStatistics = None,
+        engine: str = "exact",
+        db_close_cuttoff: float = None
+)->List[int]:
+    return list(iter_silence_slices(
+        stream,
+        min_duration=min_duration,
+        db_cuttoff=db_cuttoff,
+        offset_correction=offset_correction,
+        statistics=statistics,
+        engine=engine,
+        db_close_cuttoff=db_close_cuttoff
+    ))
 
 
 __all__ = [ 
     "AudioStream",
+    "SilenceDetector",
+    "CoarseSilenceDetector",
+    "iter_silence_slices",
     "split_by_silence_ts"
 ]
\ No newline at end of file
@@ -1,19 +1,34 @@
 import os, sys
 _SCRIPT_PATH = os.path.dirname(os.path.realpath(__file__))
 sys.path.append(os.path.join(_SCRIPT_PATH, "."))
-from typing import Any, Callable, Dict, Tuple
+from typing import Any, Callable, Dict, List, Tuple
 import subprocess as sp
 import json
 from enum import Enum
 import enum
 import re
 import shutil
+import tempfile
+import threading
 
 
 class FfmpegNotInPath(Exception):
     pass
 
 
+class FfmpegError(Exception):
+
+
+    def __init__(self, command: List[str], returncode: int, stderr: str = "") -> None:
+        self.command = command
+        self.returncode = returncode
+        self.stderr = stderr.strip()
+        message = f"{command[0]} exited with code {returncode}"
+        if self.stderr:
+            message += f": {self.stderr}"
+        super().__init__(message)
+
+
 FFMPEG_BIN = "ffmpeg"
 _ffmpeg_path = shutil.which(FFMPEG_BIN)
 if _ffmpeg_path is None:
@@ -144,6 +159,144 @@ class AudioFormat:
         return cls(byte_fmt, bits, endianess)
 
 
+class ProcessBudget:
+
+
+    def __init__(self, max_processes: int, semaphore: Any = None) -> None:
+        # A multiprocessing semaphore shared with worker processes makes the
+        # cap global across them; by default it only covers this process.
+        if max_processes < 1:
+            raise ValueError("max_processes must be at least 1")
+        self.max_processes = max_processes
+        self._semaphore = semaphore or threading.BoundedSemaphore(max_processes)
+        self._lock = threading.Lock()
+        self._active = 0
+
+
+    @property
+    def active(self)->int:
+        # children started by this process only
+        return self._active
+
+
+    def acquire(self):
+        self._semaphore.acquire()
+        with self._lock:
+            self._active += 1
+
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+        self._semaphore.release()
+
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+_process_budget = ProcessBudget(os.cpu_count() or 1)
+
+
+def get_process_budget()->ProcessBudget:
+    return _process_budget
+
+
+def set_max_processes(max_processes: int, semaphore: Any = None):
+    # Only affects processes started after the call; running children keep
+    # the slot they hold in the previous budget.
+    global _process_budget
+    _process_budget = ProcessBudget(max_processes, semaphore)
+
+
+def _run(command_str: List[str], **kwargs)->sp.CompletedProcess:
+    with _process_budget:
+        result = sp.run(command_str, stdout=sp.PIPE, stderr=sp.PIPE, **kwargs)
+    if result.returncode != 0:
+        stderr = result.stderr
+        if isinstance(stderr, bytes):
+            stderr = stderr.decode(errors="replace")
+        raise FfmpegError(command_str, result.returncode, stderr)
+    return result
+
+
+class FfmpegStream:
+
+
+    def __init__(self, command_str: List[str], buff_size: int = -1) -> None:
+        self.command = command_str
+        self._budget = _process_budget
+        self._budget.acquire()
+        try:
+            # stderr goes to a file so a chatty child can never block on a full pipe
+            self._stderr = tempfile.TemporaryFile()
+            self._process = sp.Popen(
+                command_str, 
+                stdout=sp.PIPE, 
+                stderr=self._stderr, 
+                bufsize=buff_size
+            )
+        except BaseException:
+            self._budget.release()
+            raise
+        self.stdout = self._process.stdout
+        self.returncode = None
+        self._at_eof = False
+
+
+    @property
+    def closed(self)->bool:
+        return self._process is None
+
+
+    def read(self, size: int = -1)->bytes:
+        data = self.stdout.read(size)
+        if not data:
+            self._at_eof = True
+        return data
+
+
+    def close(self, check: bool = True):
+        if self._process is None:
+            return
+        process, self._process = self._process, None
+        try:
+            at_eof = self._at_eof or process.poll() is not None
+            self.stdout.close()
+            if not at_eof:
+                # closed before the end of the stream; not an error
+                process.terminate()
+                check = False
+            self.returncode = process.wait()
+            self._stderr.seek(0)
+            stderr = self._stderr.read().decode(errors="replace")
+            self._stderr.close()
+        finally:
+            self._budget.release()
+        if check and self.returncode != 0:
+            raise FfmpegError(self.command, self.returncode, stderr)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(check=exc_type is None)
+
+
+    def __del__(self):
+        try:
+            self.close(check=False)
+        except Exception:
+            pass
+
+
 def open_stream(
         src: str,
         buff_size: int = 10**8,
@@ -151,7 +304,7 @@ def open_stream(
         sampling_rate: int = 44100,
         num_channels: int = 2,
         out_format: AudioFormat = None
-)->sp.Popen:
+)->FfmpegStream:
 
     out_format = out_format or AudioFormat()
     command_str = [
@@ -162,11 +315,10 @@ def open_stream(
         "-ar", str(sampling_rate), 
         "-ac", str(num_channels),
         "-nostats",
-        "-loglevel", "quiet",
+        "-loglevel", "error",
         "-"
     ]
-    pipe = sp.Popen(command_str, stdout=sp.PIPE, bufsize=buff_size)
-    return pipe
+    return FfmpegStream(command_str, buff_size=buff_size)
 
 
 def get_metadata(
@@ -175,12 +327,12 @@ def get_metadata(
 
     command_str = [
         FFPROBE_BIN,
-        "-loglevel", "quiet",
+        "-loglevel", "error",
         "-show_streams",
         "-of", "json",
         src
     ]
-    result = json.loads(sp.check_output(command_str))
+    result = json.loads(_run(command_str).stdout)
     return result
 
 
@@ -196,16 +348,21 @@ def copy_audio_segment(
     command_str = [
         FFMPEG_BIN,
         "-y",
-        "-loglevel", "quiet",
+        "-loglevel", "error",
         "-i", src,
         "-af", atrim_cmd,
         dst
     ]
-    sp.run(command_str, text=True, input="y\n")
+    _run(command_str, text=True, input="y\n")
 
 
 __all__ = [
+    "FfmpegError",
     "AudioFormat",
+    "ProcessBudget",
+    "get_process_budget",
+    "set_max_processes",
+    "FfmpegStream",
     "open_stream",
     "get_metadata",
     "copy_audio_segment"
@@ -0,0 +1,285 @@
+import os, sys
+_SCRIPT_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(_SCRIPT_PATH, "."))
+from typing import Any, Dict, Iterable, List, Set, Tuple
+import hashlib
+import sqlite3
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    id          INTEGER PRIMARY KEY,
+    path        TEXT NOT NULL UNIQUE,
+    source_cd   TEXT,
+    track       TEXT,
+    sample_name TEXT,
+    start_ts    INTEGER,
+    end_ts      INTEGER,
+    size        INTEGER,
+    mtime_ns    INTEGER,
+    sha1        TEXT
+);
+CREATE INDEX IF NOT EXISTS samples_name ON samples (sample_name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS samples_cd_track ON samples (source_cd, track);
+"""
+
+# external-content full-text index kept in sync with the samples table by triggers
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS samples_fts USING fts5(
+    sample_name, track, source_cd,
+    content='samples', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS samples_ai AFTER INSERT ON samples BEGIN
+    INSERT INTO samples_fts (rowid, sample_name, track, source_cd)
+    VALUES (new.id, new.sample_name, new.track, new.source_cd);
+END;
+CREATE TRIGGER IF NOT EXISTS samples_ad AFTER DELETE ON samples BEGIN
+    INSERT INTO samples_fts (samples_fts, rowid, sample_name, track, source_cd)
+    VALUES ('delete', old.id, old.sample_name, old.track, old.source_cd);
+END;
+CREATE TRIGGER IF NOT EXISTS samples_au AFTER UPDATE ON samples BEGIN
+    INSERT INTO samples_fts (samples_fts, rowid, sample_name, track, source_cd)
+    VALUES ('delete', old.id, old.sample_name, old.track, old.source_cd);
+    INSERT INTO samples_fts (rowid, sample_name, track, source_cd)
+    VALUES (new.id, new.sample_name, new.track, new.source_cd);
+END;
+"""
+
+_COLUMNS = [
+    "path",
+    "source_cd",
+    "track",
+    "sample_name",
+    "start_ts",
+    "end_ts",
+    "size",
+    "mtime_ns",
+    "sha1"
+]
+
+
+def _hash_file(filename: str, block_size: int = 2**20)->str:
+    digest = hashlib.sha1()
+    with open(filename, "rb") as in_file:
+        for block in iter(lambda: in_file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _strip_wav_ext(name: str)->str:
+    name = name.strip()
+    if name.lower().endswith(".wav"):
+        name = name[:-4]
+    return name
+
+
+def _to_fts_query(text: str)->str:
+    # every word must match, as a prefix, regardless of fts5 operator characters
+    words = text.replace('"', " ").split()
+    return " ".join(f'"{word}"*' for word in words)
+
+
+class SampleLibrary:
+
+
+    def __init__(self, db_filename: str) -> None:
+        self.db_filename = db_filename
+        directory = os.path.dirname(db_filename)
+        if len(directory) > 0:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(db_filename)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(_SCHEMA)
+        try:
+            self._connection.executescript(_FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            # sqlite built without fts5; fall back to indexed prefix/substring matches
+            self.has_fts = False
+
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def __len__(self)->int:
+        return self._connection.execute("SELECT COUNT(*) FROM samples").fetchone()[0]
+
+
+    def _make_row(
+            self,
+            record: Dict[str, Any],
+            source_cd: str,
+            existing: sqlite3.Row
+    )->Dict[str, Any]:
+        path = record["path"]
+        sample_name = record.get("sample_name") or os.path.basename(path)
+        row = {
+            "path":         path,
+            "source_cd":    source_cd,
+            "track":        _strip_wav_ext(os.path.basename(record.get("track") or record.get("source") or "")),
+            "sample_name":  _strip_wav_ext(sample_name),
+            "start_ts":     record.get("start_ts"),
+            "end_ts":       record.get("end_ts"),
+            "size":         record.get("size"),
+            "mtime_ns":     None,
+            "sha1":         record.get("sha1")
+        }
+        if os.path.isfile(path):
+            stat_result = os.stat(path)
+            row["size"] = stat_result.st_size
+            row["mtime_ns"] = stat_result.st_mtime_ns
+            unchanged = (
+                existing is not None
+                and existing["size"] == row["size"]
+                and existing["mtime_ns"] == row["mtime_ns"]
+            )
+            # only re-hash files whose size or modification time changed
+            row["sha1"] = existing["sha1"] if unchanged else _hash_file(path)
+        return row
+
+
+    def upsert(
+            self,
+            records: Iterable[Dict[str, Any]],
+            source_cd: str = None
+    )->int:
+        columns = ", ".join(_COLUMNS)
+        placeholders = ", ".join(f":{c}" for c in _COLUMNS)
+        updates = ", ".join(f"{c} = excluded.{c}" for c in _COLUMNS[1:])
+        changed_clause = " OR ".join(f"{c} IS NOT excluded.{c}" for c in _COLUMNS[1:])
+        statement = (
+            f"INSERT INTO samples ({columns}) VALUES ({placeholders}) "
+            f"ON CONFLICT (path) DO UPDATE SET {updates} WHERE {changed_clause}"
+        )
+
+        rows = []
+        for record in records:
+            if record.get("path") is None:
+                continue
+            path = record["path"]
+            if record.get("archive") is not None:
+                # members may sit in sub-folders, but all under the archive's own path
+                location = (os.path.abspath(record["archive"]), True)
+                path = os.path.join(record["archive"], path)
+            else:
+                location = (os.path.dirname(os.path.abspath(path)), False)
+            rows.append(dict(record, path=os.path.abspath(path), archive=None, location=location))
+
+        existing = self._fetch_existing([row["path"] for row in rows])
+        changed_rows = []
+        track_outputs: Dict[Tuple[str, str], Tuple[Set[str], Set[Tuple[str, bool]]]] = {}
+        for record in rows:
+            previous = existing.get(record["path"])
+            row = self._make_row(record, source_cd, previous)
+            paths, locations = track_outputs.setdefault((row["source_cd"], row["track"]), (set(), set()))
+            paths.add(row["path"])
+            locations.add(record["location"])
+            if previous is not None and all(previous[c] == row[c] for c in _COLUMNS):
+                continue
+            changed_rows.append(row)
+
+        with self._connection:
+            self._connection.executemany(statement, changed_rows)
+            removed = self._remove_stale(track_outputs)
+        return len(changed_rows) + removed
+
+
+    def _remove_stale(
+            self,
+            track_outputs: Dict[Tuple[str, str], Tuple[Set[str], Set[Tuple[str, bool]]]]
+    )->int:
+        # A re-split track replaces its rows in the output it was written to:
+        # the same directory, or the same archive. Earlier splits of the track
+        # into other destinations are left alone.
+        stale = []
+        for (source_cd, track), (paths, locations) in track_outputs.items():
+            directories = set(location for location, is_archive in locations if not is_archive)
+            archives = tuple(location + os.sep for location, is_archive in locations if is_archive)
+            for row in self._connection.execute(
+                "SELECT id, path FROM samples WHERE source_cd IS ? AND track IS ?",
+                (source_cd, track)
+            ):
+                path = row["path"]
+                if path in paths:
+                    continue
+                if os.path.dirname(path) in directories or path.startswith(archives):
+                    stale.append((row["id"],))
+        self._connection.executemany("DELETE FROM samples WHERE id = ?", stale)
+        return len(stale)
+
+
+    def _fetch_existing(self, paths: List[str])->Dict[str, sqlite3.Row]:
+        columns = ", ".join(_COLUMNS)
+        existing = {}
+        chunk_size = 500    # stays below sqlite's bound-parameter limit
+        for i in range(0, len(paths), chunk_size):
+            chunk = paths[i:i + chunk_size]
+            placeholders = ", ".join("?" for _ in chunk)
+            for row in self._connection.execute(
+                f"SELECT {columns} FROM samples WHERE path IN ({placeholders})", chunk
+            ):
+                existing[row["path"]] = row
+        return existing
+
+
+    def query(
+            self,
+            text: str,
+            source_cd: str = None,
+            limit: int = 50,
+            exact: bool = False
+    )->List[Dict[str, Any]]:
+        columns = ", ".join(f"samples.{c}" for c in _COLUMNS)
+        conditions = []
+        parameters: List[Any] = []
+
+        fts_query = _to_fts_query(text)
+        if exact:
+            statement = f"SELECT {columns} FROM samples"
+            conditions.append("samples.sample_name = ? COLLATE NOCASE")
+            parameters.append(_strip_wav_ext(text))
+            order = "samples.path"
+        elif self.has_fts and len(fts_query) > 0:
+            statement = (
+                f"SELECT {columns} FROM samples_fts "
+                f"JOIN samples ON samples.id = samples_fts.rowid"
+            )
+            conditions.append("samples_fts MATCH ?")
+            parameters.append(fts_query)
+            # ranking every match would sort the whole result set; rowid order keeps LIMIT cheap
+            order = "samples_fts.rowid"
+        else:
+            statement = f"SELECT {columns} FROM samples"
+            for word in text.split():
+                conditions.append("samples.sample_name LIKE ? ESCAPE '\\'")
+                escaped = word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                parameters.append(f"%{escaped}%")
+            order = "samples.sample_name COLLATE NOCASE"
+
+        if source_cd is not None:
+            conditions.append("samples.source_cd = ?")
+            parameters.append(source_cd)
+        if len(conditions) > 0:
+            statement += " WHERE " + " AND ".join(conditions)
+        statement += f" ORDER BY {order} LIMIT ?"
+        parameters.append(limit)
+
+        rows = self._connection.execute(statement, parameters).fetchall()
+        return [dict(row) for row in rows]
+
+
+__all__ = [
+    "SampleLibrary"
+]
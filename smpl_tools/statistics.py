@@ -0,0 +1,182 @@
+import os, sys
+_SCRIPT_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(_SCRIPT_PATH, "."))
+from typing import Any, Dict, Iterable, List
+import json
+import numpy as np
+
+
+STATISTICS_COLUMNS = [
+    "start_ts",
+    "end_ts",
+    "duration_ts",
+    "duration",
+    "peak",
+    "peak_db",
+    "rms",
+    "rms_db",
+    "dc_offset",
+    "clipped"
+]
+
+
+def _to_db(x: float)->float:
+    return float(20 * np.log10(x)) if x > 0 else float("-inf")
+
+
+class SliceStatistics:
+
+
+    def __init__(
+            self,
+            full_scale: float = 2**15,
+            sample_rate: int = 44100,
+            num_channels: int = 1
+    ) -> None:
+        self.full_scale = float(full_scale)
+        self.clip_level = full_scale - 1
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+
+        self._pending: List[np.ndarray] = []
+        self._pending_start = 0     # frame index of the first pending frame
+        self._fed = 0               # total frames fed
+        self._boundaries: List[int] = []
+        self._last_boundary = -1
+        self._slices: List[Dict[str, Any]] = []
+        self._current: Dict[str, Any] = None
+
+
+    def feed(self, buffer: np.ndarray):
+        # buffer holds interleaved samples; statistics are computed over every channel
+        if buffer.size > 0:
+            self._pending.append(buffer)
+            self._fed += buffer.size // self.num_channels
+
+
+    def add_boundaries(self, slices: Iterable[int]):
+        for s in sorted(int(s) for s in slices):
+            if s > self._last_boundary:
+                self._boundaries.append(s)
+                self._last_boundary = s
+
+
+    def _open_slice(self, start_ts: int):
+        self._current = {
+            "start_ts": start_ts,
+            "frames":   0,
+            "peak":     0.0,
+            "sum":      0.0,
+            "sum_sq":   0.0,
+            "clipped":  0
+        }
+        self._slices.append(self._current)
+
+
+    def _accumulate(self, frames: np.ndarray, start_ts: int, boundaries: List[int]):
+        # split the frames at the boundaries and reduce every piece in one pass
+        cuts = [b - start_ts for b in boundaries]
+        if self._current is None:
+            if len(cuts) == 0:
+                return
+            frames = frames[cuts[0]:]
+            start_ts = boundaries[0]
+            cuts = [c - cuts[0] for c in cuts]
+        else:
+            cuts = [0] + cuts
+
+        # reduceat requires the offsets to index into the array
+        samples = frames.reshape(-1).astype(np.float64)
+        offsets = np.asarray(cuts, dtype=np.int64) * self.num_channels
+        if samples.size == 0:
+            return
+
+        lengths = np.diff(np.append(offsets, samples.size)) // self.num_channels
+        magnitudes = np.abs(samples)
+        peaks = np.maximum.reduceat(magnitudes, offsets)
+        sums = np.add.reduceat(samples, offsets)
+        sums_sq = np.add.reduceat(samples * samples, offsets)
+        clipped = np.add.reduceat((magnitudes >= self.clip_level).view(np.int8).astype(np.int64), offsets)
+
+        for i in range(offsets.size):
+            if i > 0 or self._current is None:
+                self._open_slice(start_ts + cuts[i])
+            if lengths[i] == 0:
+                continue
+            current = self._current
+            current["frames"]   += int(lengths[i])
+            current["peak"]     = max(current["peak"], float(peaks[i]))
+            current["sum"]      += float(sums[i])
+            current["sum_sq"]   += float(sums_sq[i])
+            current["clipped"]  += int(clipped[i])
+
+
+    def advance(self, watermark: int):
+        # every boundary before the watermark is known; reduce the frames up to it
+        watermark = min(watermark, self._fed)
+        if watermark <= self._pending_start or len(self._pending) == 0:
+            return
+
+        pending = np.concatenate(self._pending) if len(self._pending) > 1 else self._pending[0]
+        split_at = (watermark - self._pending_start) * self.num_channels
+        ready, rest = pending[:split_at], pending[split_at:]
+
+        boundaries = [b for b in self._boundaries if self._pending_start <= b < watermark]
+        self._boundaries = [b for b in self._boundaries if b >= watermark]
+        self._accumulate(ready.reshape(-1, self.num_channels), self._pending_start, boundaries)
+
+        self._pending = [rest] if rest.size > 0 else []
+        self._pending_start = watermark
+
+
+    def finish(self)->List[Dict[str, Any]]:
+        self.advance(self._fed)
+
+        results = []
+        for current in self._slices:
+            frames = current["frames"]
+            num_samples = max(frames * self.num_channels, 1)
+            peak = current["peak"] / self.full_scale
+            rms = float(np.sqrt(current["sum_sq"] / num_samples)) / self.full_scale
+            results.append({
+                "start_ts":     current["start_ts"],
+                "end_ts":       current["start_ts"] + frames,
+                "duration_ts":  frames,
+                "duration":     frames / self.sample_rate,
+                "peak":         peak,
+                "peak_db":      _to_db(peak),
+                "rms":          rms,
+                "rms_db":       _to_db(rms),
+                "dc_offset":    current["sum"] / num_samples / self.full_scale,
+                "clipped":      current["clipped"]
+            })
+        return results
+
+
+def write_statistics_sidecar(
+        filename: str,
+        records: List[Dict[str, Any]]
+):
+    # columnar layout: one array per field, so a column can be scanned without the others
+    columns = ["source", "path"] + STATISTICS_COLUMNS
+    table = {column: [record.get(column) for record in records] for column in columns}
+    for column in ("peak_db", "rms_db"):
+        table[column] = [None if x is None or np.isinf(x) else x for x in table[column]]
+
+    directory = os.path.dirname(filename)
+    if len(directory) > 0:
+        os.makedirs(directory, exist_ok=True)
+    with open(filename, "w") as json_file:
+        json.dump({"rows": len(records), "columns": table}, json_file)
+
+
+def read_statistics_sidecar(filename: str)->Dict[str, List[Any]]:
+    with open(filename, "r") as json_file:
+        return json.load(json_file)["columns"]
+
+
+__all__ = [
+    "SliceStatistics",
+    "write_statistics_sidecar",
+    "read_statistics_sidecar"
+]
@@ -0,0 +1,226 @@
+import os, sys
+_SCRIPT_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(_SCRIPT_PATH, "."))
+from typing import Any, Dict, List, Tuple, Union
+from concurrent.futures import Future, ProcessPoolExecutor
+import json
+import multiprocessing
+import signal
+import time
+
+from . import ffmpeg
+from .actions import _load_batch_entries
+from .actions import _resolve_naming_pattern
+from .actions import _split_batch_entry
+from .library import SampleLibrary
+
+
+STATE_FILENAME = ".smpl_tools_watch.json"
+
+FileSignature = Tuple[int, int]
+
+
+def _init_worker(max_processes: int, budget_semaphore: Any):
+    # Ctrl+C reaches the whole process group; only the parent handles it and
+    # shuts the pool down, so workers must not raise KeyboardInterrupt mid-task.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # every worker draws ffmpeg slots from the same semaphore
+    ffmpeg.set_max_processes(max_processes, budget_semaphore)
+
+
+def _process_track(
+        entry:              Dict[str, Any],
+        source_path:        str,
+        naming_pattern:     str
+)->List[Dict[str, Any]]:
+    # the entry's own source name is kept for naming; only the file read differs
+    return _split_batch_entry(
+        entry,
+        os.path.dirname(source_path),
+        naming_pattern,
+        source_path=source_path
+    )
+
+
+def _file_signature(stat_result: os.stat_result)->FileSignature:
+    return (int(stat_result.st_size), int(stat_result.st_mtime_ns))
+
+
+def _entry_keys(source_name: str)->List[str]:
+    key = source_name.strip().lower()
+    keys = [key]
+    if not key.endswith(".wav"):
+        keys.append(key + ".wav")
+    return keys
+
+
+class WatchFolder:
+
+
+    def __init__(
+            self,
+            batch_filename:     str,
+            source_dirs:        Union[str, List[str]],
+            destination_dir:    str,
+            naming_pattern:     str = None,
+            settle_time:        float = 2,
+            poll_interval:      float = 0.5,
+            num_workers:        int = None,
+            library_filename:   str = None,
+            source_cd:          str = None
+    ) -> None:
+        if isinstance(source_dirs, str):
+            source_dirs = [source_dirs]
+        self.source_dirs = list(source_dirs)
+        self.destination_dir = destination_dir
+        self.naming_pattern = _resolve_naming_pattern(naming_pattern, destination_dir)
+        self.settle_time = settle_time
+        self.poll_interval = poll_interval
+        self.num_workers = num_workers
+        self.library_filename = library_filename
+        self.source_cd = source_cd
+        if source_cd is None:
+            self.source_cd = os.path.splitext(os.path.basename(batch_filename))[0]
+
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        for entry in _load_batch_entries(batch_filename):
+            for key in _entry_keys(entry["source"]):
+                self._entries.setdefault(key, entry)
+
+        self._state_filename = os.path.join(destination_dir, STATE_FILENAME)
+        self._processed: Dict[str, FileSignature] = self._load_state()
+        self._failed: Dict[str, FileSignature] = {}
+        self._observed: Dict[str, Tuple[FileSignature, float]] = {}
+        self._in_flight: Dict[Future, Tuple[str, FileSignature]] = {}
+        self._executor: ProcessPoolExecutor = None
+
+
+    def _load_state(self)->Dict[str, FileSignature]:
+        if not os.path.isfile(self._state_filename):
+            return {}
+        with open(self._state_filename, "r") as json_file:
+            json_data = json.load(json_file)
+        return {path: tuple(signature) for path, signature in json_data.items()}
+
+
+    def _save_state(self):
+        os.makedirs(self.destination_dir, exist_ok=True)
+        tmp_filename = self._state_filename + ".tmp"
+        with open(tmp_filename, "w") as json_file:
+            json.dump(self._processed, json_file, indent=2)
+        os.replace(tmp_filename, self._state_filename)
+
+
+    def match_entry(self, filename: str)->Union[Dict[str, Any], None]:
+        return self._entries.get(os.path.basename(filename).strip().lower())
+
+
+    def scan(self, now: float = None)->List[Tuple[str, FileSignature]]:
+        now = time.monotonic() if now is None else now
+        busy = set(path for path, _ in self._in_flight.values())
+
+        ready = []
+        for source_dir in self.source_dirs:
+            if not os.path.isdir(source_dir):
+                continue
+            for dir_entry in os.scandir(source_dir):
+                if not dir_entry.is_file() or self.match_entry(dir_entry.name) is None:
+                    continue
+                path = os.path.abspath(dir_entry.path)
+                signature = _file_signature(dir_entry.stat())
+
+                # restart the settle timer whenever the file is still being written
+                previous = self._observed.get(path)
+                if previous is None or previous[0] != signature:
+                    self._observed[path] = (signature, now)
+                    continue
+                if now - previous[1] < self.settle_time:
+                    continue
+
+                if path in busy:
+                    continue
+                if self._processed.get(path) == signature:
+                    continue
+                if self._failed.get(path) == signature:
+                    continue
+                ready.append((path, signature))
+        return ready
+
+
+    def start(self):
+        if self._executor is None:
+            max_processes = ffmpeg.get_process_budget().max_processes
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                initializer=_init_worker,
+                initargs=(max_processes, multiprocessing.BoundedSemaphore(max_processes))
+            )
+        return self
+
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._collect()
+            self._executor = None
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+    def _collect(self):
+        changed = False
+        for future in [f for f in self._in_flight if f.done()]:
+            path, signature = self._in_flight.pop(future)
+            error = future.exception()
+            if error is not None:
+                self._failed[path] = signature
+                print(f"Failed: {path} ({error})")
+            else:
+                self._processed[path] = signature
+                self._failed.pop(path, None)
+                changed = True
+                if self.library_filename is not None:
+                    # the index is only ever written from this process
+                    with SampleLibrary(self.library_filename) as library:
+                        library.upsert(future.result(), self.source_cd)
+        if changed:
+            self._save_state()
+
+
+    def poll_once(self, now: float = None)->int:
+        self.start()
+        self._collect()
+        ready = self.scan(now)
+        for path, signature in ready:
+            entry = self.match_entry(path)
+            print(f"Queued: {path}")
+            future = self._executor.submit(
+                _process_track,
+                entry,
+                path,
+                self.naming_pattern
+            )
+            self._in_flight[future] = (path, signature)
+        return len(ready)
+
+
+    def run(self):
+        print(f"Watching {', '.join(self.source_dirs)} (Ctrl+C to stop)")
+        with self:
+            try:
+                while True:
+                    self.poll_once()
+                    time.sleep(self.poll_interval)
+            except KeyboardInterrupt:
+                pass
+
+
+__all__ = [
+    "WatchFolder"
+]
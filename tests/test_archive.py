@@ -0,0 +1,76 @@
+from smpl_tools.archive import SampleArchive, arcname, load_index, pcm_to_wav, read_sample
+import hashlib
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+import wave
+import zipfile
+
+
+class SampleArchiveTest(unittest.TestCase):
+
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.pcm = {
+            "Track 01/Alpha.wav":   b"\x01\x00\x02\x00" * 100,
+            "Track 01/Beta.wav":    b"\x03\x00\x04\x00" * 333,
+            "Track 02/Gamma.wav":   b"\x05\x00\x06\x00" * 7
+        }
+
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+
+    def _write_archive(self, filename):
+        archive_filename = os.path.join(self._tmp_dir.name, filename)
+        with SampleArchive(archive_filename, write_index=True) as archive:
+            for name, pcm in self.pcm.items():
+                archive.add(name, pcm_to_wav(pcm, 44100, 2, 2))
+        return archive_filename
+
+
+    def _assert_wav_matches(self, data, pcm):
+        with wave.open(io.BytesIO(data), "rb") as wav_file:
+            self.assertEqual(wav_file.getnchannels(), 2)
+            self.assertEqual(wav_file.getframerate(), 44100)
+            self.assertEqual(wav_file.readframes(wav_file.getnframes()), pcm)
+
+
+    def test_tar_members_and_index(self):
+        archive_filename = self._write_archive("out.tar")
+        with tarfile.open(archive_filename) as tar_file:
+            self.assertEqual(sorted(tar_file.getnames()), sorted(self.pcm))
+            for name, pcm in self.pcm.items():
+                self._assert_wav_matches(tar_file.extractfile(name).read(), pcm)
+
+        index = load_index(archive_filename)
+        for name, pcm in self.pcm.items():
+            self._assert_wav_matches(read_sample(archive_filename, name, index), pcm)
+
+
+    def test_zip_members_and_index(self):
+        archive_filename = self._write_archive("out.zip")
+        with zipfile.ZipFile(archive_filename) as zip_file:
+            self.assertEqual(sorted(zip_file.namelist()), sorted(self.pcm))
+            for name, pcm in self.pcm.items():
+                self._assert_wav_matches(zip_file.read(name), pcm)
+
+        for name, pcm in self.pcm.items():
+            self._assert_wav_matches(read_sample(archive_filename, name), pcm)
+
+
+    def test_arcname_relative_to_destination(self):
+        dst = os.path.join("output", "Track 01", "Alpha.wav")
+        self.assertEqual(arcname(dst, "output"), "Track 01/Alpha.wav")
+        self.assertEqual(arcname(os.path.abspath(dst)), os.path.abspath(dst).lstrip("/"))
+
+
+    def test_add_returns_member_hash(self):
+        archive_filename = os.path.join(self._tmp_dir.name, "out.zip")
+        with SampleArchive(archive_filename) as archive:
+            digest = archive.add("a.wav", b"abc")
+        self.assertEqual(digest, hashlib.sha1(b"abc").hexdigest())
@@ -0,0 +1,113 @@
+from smpl_tools import ffmpeg
+from smpl_tools.audio_stream import AudioStream
+import os
+import tempfile
+import threading
+import unittest
+import wave
+
+
+def _write_test_wav(filename, num_frames=4410):
+    with wave.open(filename, "wb") as wav_file:
+        wav_file.setnchannels(2)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(44100)
+        wav_file.writeframes(b"\x10\x00" * 2 * num_frames)
+
+
+def _count_open_fds():
+    return len(os.listdir("/proc/self/fd"))
+
+
+def _has_unreaped_children():
+    try:
+        return os.waitpid(-1, os.WNOHANG) != (0, 0)
+    except ChildProcessError:
+        return False
+
+
+class FfmpegProcessTest(unittest.TestCase):
+
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.src = os.path.join(self._tmp_dir.name, "src.wav")
+        _write_test_wav(self.src)
+
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+
+    def test_stream_closed_after_context(self):
+        with AudioStream(self.src) as stream:
+            next(stream)
+        self.assertTrue(stream.closed)
+        self.assertEqual(ffmpeg.get_process_budget().active, 0)
+
+
+    def test_stream_reaped_when_exhausted(self):
+        stream = AudioStream(self.src)
+        for _ in stream:
+            pass
+        self.assertTrue(stream.closed)
+        self.assertEqual(ffmpeg.get_process_budget().active, 0)
+
+
+    def test_stream_decodes_native_channel_layout(self):
+        with AudioStream(self.src) as stream:
+            self.assertEqual(stream.num_channels, 2)
+            self.assertEqual(stream.sample_rate, 44100)
+            samples = next(stream)
+        self.assertEqual(samples.size % 2, 0)
+        self.assertEqual(samples[0], 16)
+
+
+    def test_copy_failure_raises(self):
+        missing = os.path.join(self._tmp_dir.name, "missing.wav")
+        dst = os.path.join(self._tmp_dir.name, "dst.wav")
+        with self.assertRaises(ffmpeg.FfmpegError) as context:
+            ffmpeg.copy_audio_segment(missing, dst, 0, 10)
+        self.assertNotEqual(context.exception.returncode, 0)
+        self.assertTrue(len(context.exception.stderr) > 0)
+
+
+    def test_budget_caps_concurrent_processes(self):
+        budget = ffmpeg.ProcessBudget(2)
+        peak = [0]
+        lock = threading.Lock()
+        release = threading.Event()
+
+        def worker():
+            with budget:
+                with lock:
+                    peak[0] = max(peak[0], budget.active)
+                release.wait(0.05)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(peak[0], 2)
+        self.assertEqual(budget.active, 0)
+
+
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "requires procfs")
+    def test_many_streams_leave_fd_and_process_counts_flat(self):
+        # warm up lazily opened descriptors before taking the baseline
+        with AudioStream(self.src) as stream:
+            next(stream)
+        fds_before = _count_open_fds()
+
+        for i in range(2000):
+            with AudioStream(self.src) as stream:
+                if i % 2:
+                    next(stream)
+                else:
+                    for _ in stream:
+                        pass
+
+        self.assertEqual(_count_open_fds(), fds_before)
+        self.assertFalse(_has_unreaped_children())
+        self.assertEqual(ffmpeg.get_process_budget().active, 0)
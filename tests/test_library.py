@@ -0,0 +1,116 @@
+from smpl_tools.library import SampleLibrary
+import os
+import tempfile
+import time
+import unittest
+
+
+class SampleLibraryTest(unittest.TestCase):
+
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.db_filename = os.path.join(self._tmp_dir.name, "library.db")
+        self.records = []
+        names = ["Programmed Loops Hardstep.wav", "Programmed Loops Jungle.wav", "Bass Hit.wav"]
+        for i, name in enumerate(names):
+            path = os.path.join(self._tmp_dir.name, "out", name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as sample_file:
+                sample_file.write(bytes([i]) * (100 + i))
+            self.records.append({
+                "source":       "Track 01.wav",
+                "track":        "Track 01.wav",
+                "sample_name":  name,
+                "index":        i,
+                "path":         path,
+                "start_ts":     1000 * i,
+                "end_ts":       1000 * (i + 1)
+            })
+
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+
+    def test_upsert_and_full_text_query(self):
+        with SampleLibrary(self.db_filename) as library:
+            self.assertEqual(library.upsert(self.records, "jungle_warfare_1"), 3)
+            results = library.query("programmed hardstep")
+        self.assertEqual(len(results), 1)
+        result = results[0]
+        self.assertEqual(result["sample_name"], "Programmed Loops Hardstep")
+        self.assertEqual(result["track"], "Track 01")
+        self.assertEqual(result["source_cd"], "jungle_warfare_1")
+        self.assertEqual((result["start_ts"], result["end_ts"]), (0, 1000))
+        self.assertEqual(result["size"], 100)
+        self.assertEqual(len(result["sha1"]), 40)
+
+
+    def test_prefix_and_exact_queries(self):
+        with SampleLibrary(self.db_filename) as library:
+            library.upsert(self.records, "jungle_warfare_1")
+            self.assertEqual(len(library.query("Prog")), 2)
+            self.assertEqual(len(library.query("bass hit.wav", exact=True)), 1)
+            self.assertEqual(len(library.query("Bass", source_cd="other_cd")), 0)
+
+
+    def test_unchanged_rows_not_rewritten(self):
+        with SampleLibrary(self.db_filename) as library:
+            library.upsert(self.records, "jungle_warfare_1")
+            self.assertEqual(library.upsert(self.records, "jungle_warfare_1"), 0)
+
+            path = self.records[2]["path"]
+            with open(path, "ab") as sample_file:
+                sample_file.write(b"changed")
+            stat_result = os.stat(path)
+            os.utime(path, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns + 10**9))
+            self.assertEqual(library.upsert(self.records, "jungle_warfare_1"), 1)
+            self.assertEqual(len(library), 3)
+            self.assertEqual(library.query("Bass")[0]["size"], 109)
+
+
+    def test_query_fast_on_large_library(self):
+        records = [
+            {"path": f"/cd{i // 1000}/sample_{i}.wav", "sample_name": f"Loop {i} Amen", "track": "t"}
+            for i in range(100000)
+        ]
+        with SampleLibrary(self.db_filename) as library:
+            library.upsert(records, "big")
+            start = time.perf_counter()
+            results = library.query("Loop 99999")
+            elapsed = time.perf_counter() - start
+        self.assertEqual(results[0]["sample_name"], "Loop 99999 Amen")
+        self.assertLess(elapsed, 0.1)
+
+
+    def test_archive_members_keep_their_hash(self):
+        record = {"path": "Track 01/Alpha.wav", "archive": "out/cd.zip", "size": 10, "sha1": "ab" * 20}
+        with SampleLibrary(self.db_filename) as library:
+            library.upsert([record], "jungle_warfare_1")
+            self.assertEqual(library.query("Alpha")[0]["sha1"], "ab" * 20)
+
+
+    def test_resplit_track_removes_stale_slices(self):
+        with SampleLibrary(self.db_filename) as library:
+            library.upsert(self.records, "jungle_warfare_1")
+            library.upsert([dict(self.records[0], path="/other/Alpha.wav")], "other_cd")
+            self.assertEqual(library.upsert(self.records[:1], "jungle_warfare_1"), 2)
+            self.assertEqual(len(library), 2)
+            self.assertEqual(len(library.query("Bass")), 0)
+
+
+    def test_resplit_into_other_destination_keeps_earlier_rows(self):
+        moved = [
+            dict(record, path=record["path"].replace(os.sep + "out" + os.sep, os.sep + "out_b" + os.sep))
+            for record in self.records[:1]
+        ]
+        archived = [dict(self.records[0], path="Alpha.wav", archive="cd.zip", sha1="ab" * 20)]
+        with SampleLibrary(self.db_filename) as library:
+            library.upsert(self.records, None)
+            self.assertEqual(library.upsert(moved, None), 1)
+            self.assertEqual(library.upsert(archived, None), 1)
+            self.assertEqual(len(library), 5)
+            # re-splitting into the first destination still replaces its own rows
+            self.assertEqual(library.upsert(self.records[:1], None), 2)
+            self.assertEqual(len(library), 3)
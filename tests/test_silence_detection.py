@@ -0,0 +1,226 @@
+from smpl_tools.audio_stream import AudioStream, CoarseSilenceDetector, SilenceDetector
+from smpl_tools.audio_stream import split_by_silence_ts
+import numpy as np
+import os
+import tempfile
+import unittest
+
+
+def reference_slices(signal, min_silence_ts, cuttoff_level, close_level=None):
+    # onset of every loud sample preceded by more than min_silence_ts silent
+    # samples; the track is treated as if preceded by silence
+    close_level = cuttoff_level if close_level is None else close_level
+    magnitudes = np.abs(signal.astype(np.float64))
+    slices = []
+    loud = False
+    run = min_silence_ts + 1
+    for i, magnitude in enumerate(magnitudes):
+        if magnitude >= cuttoff_level:
+            is_loud = True
+        elif magnitude < close_level:
+            is_loud = False
+        else:
+            is_loud = loud
+        if is_loud:
+            if not loud and run > min_silence_ts:
+                slices.append(i)
+            run = 0
+        else:
+            run += 1
+        loud = is_loud
+    return slices
+
+
+def feed_in_random_buffers(rng, detector, signal, max_buffer_size=500):
+    slices = []
+    position = 0
+    while position < signal.size:
+        buffer_size = int(rng.integers(1, max_buffer_size))
+        slices += detector.feed(signal[position:position + buffer_size])
+        position += buffer_size
+    return slices + detector.finish()
+
+
+def random_signal(rng, num_samples):
+    signal = np.zeros(num_samples, dtype=np.int16)
+    position = int(rng.integers(0, 50))
+    while position < num_samples:
+        length = int(rng.integers(1, 120))
+        burst = rng.integers(-3000, 3000, min(length, num_samples - position)).astype(np.int16)
+        signal[position:position + burst.size] = burst
+        position += length + int(rng.integers(0, 150))
+    return signal
+
+
+class SilenceDetectorTest(unittest.TestCase):
+
+
+    def test_matches_reference_for_any_buffer_size(self):
+        rng = np.random.default_rng(7)
+        for _ in range(300):
+            signal = random_signal(rng, int(rng.integers(1, 3000)))
+            min_silence_ts = int(rng.integers(1, 120))
+            cuttoff_level = float(rng.integers(1, 2000))
+            detector = SilenceDetector(min_silence_ts, cuttoff_level)
+            self.assertEqual(
+                feed_in_random_buffers(rng, detector, signal),
+                reference_slices(signal, min_silence_ts, cuttoff_level)
+            )
+
+
+    def test_hysteresis_matches_reference_for_any_buffer_size(self):
+        rng = np.random.default_rng(8)
+        for _ in range(300):
+            signal = random_signal(rng, int(rng.integers(1, 3000)))
+            min_silence_ts = int(rng.integers(1, 120))
+            cuttoff_level = float(rng.integers(1, 3000))
+            close_level = float(rng.integers(1, cuttoff_level + 1))
+            detector = SilenceDetector(min_silence_ts, cuttoff_level, close_level)
+            self.assertEqual(
+                feed_in_random_buffers(rng, detector, signal),
+                reference_slices(signal, min_silence_ts, cuttoff_level, close_level)
+            )
+
+
+    def test_hysteresis_ignores_decay_between_thresholds(self):
+        signal = np.zeros(100, dtype=np.int16)
+        signal[10:20] = 1000
+        signal[20:75] = 50      # quieter than open, louder than close
+        signal[80:90] = 1000
+        self.assertEqual(SilenceDetector(15, 100).feed(signal), [10, 80])
+        self.assertEqual(SilenceDetector(15, 100, 10).feed(signal), [10])
+
+
+    def test_close_level_above_open_level_rejected(self):
+        with self.assertRaises(ValueError):
+            SilenceDetector(10, 100, 200)
+
+
+class CoarseSilenceDetectorTest(unittest.TestCase):
+
+
+    def test_matches_reference_for_any_buffer_and_block_size(self):
+        rng = np.random.default_rng(5)
+        for _ in range(300):
+            signal = random_signal(rng, int(rng.integers(1, 3000)))
+            min_silence_ts = int(rng.integers(1, 120))
+            cuttoff_level = float(rng.integers(1, 4))
+            detector = CoarseSilenceDetector(
+                min_silence_ts,
+                cuttoff_level,
+                block_size=int(rng.integers(1, 64))
+            )
+            self.assertEqual(
+                feed_in_random_buffers(rng, detector, signal),
+                reference_slices(signal, min_silence_ts, cuttoff_level)
+            )
+
+
+    def test_full_scale_negative_sample_is_loud(self):
+        detector = CoarseSilenceDetector(4, 100)
+        signal = np.zeros(20, dtype=np.int16)
+        signal[10] = -2**15
+        self.assertEqual(detector.feed(signal) + detector.finish(), [10])
+
+
+class SilenceEngineTest(unittest.TestCase):
+
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.signal = rng.integers(-10, 10, 44100 * 30).astype(np.int16)
+        position = 13000
+        while position < self.signal.size:
+            length = int(rng.uniform(0.5, 3) * 44100)
+            burst = rng.integers(-20000, 20000, min(length, self.signal.size - position))
+            self.signal[position:position + burst.size] = burst
+            position += length + int(rng.uniform(0.5, 2) * 44100)
+        self.src = os.path.join(self._tmp_dir.name, "track.pcm")
+        self.signal.tofile(self.src)
+
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+
+    def _slices(self, engine, min_duration=0.4, buffer_duration=1):
+        stream = AudioStream.from_raw(self.src, 44100, 1, buffer_duration=buffer_duration)
+        return split_by_silence_ts(stream, min_duration=min_duration, engine=engine)
+
+
+    def test_exact_engine_independent_of_buffer_size(self):
+        expected = self._slices("exact")
+        for buffer_duration in (0.001, 0.37, 5):
+            self.assertEqual(self._slices("exact", buffer_duration=buffer_duration), expected)
+
+
+    def test_coarse_engine_matches_exact_engine(self):
+        for min_duration in (0.1, 0.4, 1.0):
+            exact = self._slices("exact", min_duration)
+            self.assertTrue(len(exact) > 1)
+            self.assertEqual(self._slices("coarse", min_duration), exact)
+
+
+    def test_engines_match_reference(self):
+        cuttoff_level = 10**(-60/20) * 2**15
+        expected = reference_slices(self.signal, int(np.ceil(0.4 * 44100)), cuttoff_level)
+        self.assertEqual(self._slices("exact"), expected)
+        self.assertEqual(self._slices("coarse"), expected)
+
+
+    def test_unknown_engine_rejected(self):
+        with self.assertRaises(ValueError):
+            self._slices("fastest")
+
+
+    def test_coarse_engine_rejects_close_cutoff(self):
+        stream = AudioStream.from_raw(self.src, 44100, 1)
+        with self.assertRaises(ValueError):
+            split_by_silence_ts(stream, engine="coarse", db_close_cuttoff=-70)
+
+
+    def test_coarse_engine_keeps_callers_buffer_size(self):
+        stream = AudioStream.from_raw(self.src, 44100, 1, buffer_duration=0.05)
+        split_by_silence_ts(stream, engine="coarse")
+        self.assertEqual(stream.buffer_duration, 0.05)
+
+
+class MultichannelDetectionTest(unittest.TestCase):
+
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+
+    def _slices(self, frames, engine="exact"):
+        src = os.path.join(self._tmp_dir.name, "track.pcm")
+        frames.astype(np.int16).tofile(src)
+        stream = AudioStream.from_raw(src, 44100, frames.shape[1], buffer_duration=0.01)
+        return split_by_silence_ts(stream, min_duration=0.01, engine=engine)
+
+
+    def test_out_of_phase_channels_are_not_silent(self):
+        rng = np.random.default_rng(3)
+        frames = np.zeros((44100, 2), dtype=np.int16)
+        for start in (1000, 20000):
+            burst = rng.integers(-20000, 20000, 5000).astype(np.int16)
+            frames[start:start + 5000, 0] = burst
+            frames[start:start + 5000, 1] = -burst
+        for engine in ("exact", "coarse"):
+            self.assertEqual(self._slices(frames, engine), [1000, 20000])
+
+
+    def test_matches_reference_on_loudest_channel(self):
+        rng = np.random.default_rng(4)
+        frames = np.stack([random_signal(rng, 30000) for _ in range(3)], axis=1)
+        frames[100, 2] = -2**15
+        cuttoff_level = 10**(-60/20) * 2**15
+        loudest = np.abs(frames.astype(np.int32)).max(axis=1)
+        expected = reference_slices(loudest, int(np.ceil(0.01 * 44100)), cuttoff_level)
+        for engine in ("exact", "coarse"):
+            self.assertEqual(self._slices(frames, engine), expected)
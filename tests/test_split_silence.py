@@ -1,5 +1,17 @@
-from smpl_tools.actions import _determine_output_samplenames, _process_naming_pattern
+from smpl_tools.actions import _determine_output_samplename, _process_naming_pattern
+from smpl_tools.actions import split_stream_by_silence
+from smpl_tools.archive import SampleArchive, read_sample
+from smpl_tools.audio_stream import AudioStream
+import gc
+import hashlib
+import io
+import numpy as np
+import os
+import sys
+import tempfile
+import tracemalloc
 import unittest
+import wave
 
 
 class SplitSilenceTest(unittest.TestCase):
@@ -7,14 +19,14 @@ class SplitSilenceTest(unittest.TestCase):
 
     def test_determine_multiple_filenames_extensionless_names_kept(self):
         extensionless_name = "my_src"
-        result = _determine_output_samplenames(None, extensionless_name, 1)
-        self.assertTrue(extensionless_name in result[0])
+        result = _determine_output_samplename(None, extensionless_name, 0)
+        self.assertTrue(extensionless_name in result)
         pass
 
 
     def test_determine_multiple_filenames_numbered_correctly(self):
         extensionless_name = "my_src"
-        result = _determine_output_samplenames(None, extensionless_name, 2)
+        result = [_determine_output_samplename(None, extensionless_name, i) for i in range(2)]
         self.assertEquals(result, ["my_src_01.wav", "my_src_02.wav"])
         pass
 
@@ -59,3 +71,126 @@ class SplitSilenceTest(unittest.TestCase):
         self.assertEquals(result, "track01/alpha1.wav")
 
 
+
+
+class SplitStreamTest(unittest.TestCase):
+
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.signal = np.zeros((44100 * 6, 2), dtype=np.int16)
+        for start, end in [(0.1, 1.0), (2.0, 2.5), (2.6, 3.0), (4.0, 5.5)]:
+            a, b = int(start * 44100), int(end * 44100)
+            self.signal[a:b] = rng.integers(-20000, 20000, (b - a, 2))
+        self.src = os.path.join(self._tmp_dir.name, "track.pcm")
+        with open(self.src, "wb") as raw_file:
+            raw_file.write(self.signal.tobytes())
+
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+
+    def test_raw_stream_slices_written_with_all_channels(self):
+        destination = os.path.join(self._tmp_dir.name, "out")
+        stream = AudioStream.from_raw(self.src, 44100, 2)
+        written = split_stream_by_silence(
+            stream, 
+            destination, 
+            source_name="track.pcm",
+            ignore_indices=[1]
+        )
+
+        self.assertTrue(stream.closed)
+        self.assertEqual([r["start_ts"] for r in written], [4410, 176400])
+        self.assertEqual(
+            [os.path.basename(r["path"]) for r in written], 
+            ["track_01.wav", "track_03.wav"]
+        )
+        for record in written:
+            with wave.open(record["path"], "rb") as wav_file:
+                self.assertEqual(wav_file.getnchannels(), 2)
+                frames = np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype="<i2")
+            expected = self.signal[record["start_ts"]:record["end_ts"]].reshape(-1)
+            self.assertTrue(np.array_equal(frames, expected))
+
+
+    def _read_frames(self, data):
+        with wave.open(io.BytesIO(data), "rb") as wav_file:
+            return np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype="<i2")
+
+
+    def test_offset_corrected_slices_written_to_files_and_archive(self):
+        destination = os.path.join(self._tmp_dir.name, "out")
+        archive_filename = os.path.join(self._tmp_dir.name, "out.zip")
+        with SampleArchive(archive_filename) as archive:
+            archived = split_stream_by_silence(
+                AudioStream.from_raw(self.src, 44100, 2, buffer_duration=0.013),
+                destination,
+                source_name="track.pcm",
+                offset_correction=0.05,
+                archive=archive,
+                archive_base_dir=destination
+            )
+        written = split_stream_by_silence(
+            AudioStream.from_raw(self.src, 44100, 2, buffer_duration=0.013),
+            destination,
+            source_name="track.pcm",
+            offset_correction=0.05
+        )
+
+        self.assertEqual([r["start_ts"] for r in written], [2205, 85995, 174195])
+        self.assertEqual(written[-1]["end_ts"], self.signal.shape[0])
+        for record, archived_record in zip(written, archived):
+            with open(record["path"], "rb") as wav_file:
+                data = wav_file.read()
+            self.assertEqual(read_sample(archive_filename, archived_record["path"], archive.index), data)
+            self.assertEqual(archived_record["sha1"], hashlib.sha1(data).hexdigest())
+            expected = self.signal[record["start_ts"]:record["end_ts"]].reshape(-1)
+            self.assertTrue(np.array_equal(self._read_frames(data), expected))
+
+
+    def test_long_slice_not_held_in_memory(self):
+        rng = np.random.default_rng(1)
+        loud = rng.integers(-20000, 20000, (44100 * 60, 2)).astype(np.int16)
+        with open(self.src, "wb") as raw_file:
+            raw_file.write(loud.tobytes())
+        del loud
+
+        tracemalloc.start()
+        written = split_stream_by_silence(
+            AudioStream.from_raw(self.src, 44100, 2, buffer_duration=0.1),
+            os.path.join(self._tmp_dir.name, "out"),
+            source_name="track.pcm"
+        )
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        self.assertEqual(len(written), 1)
+        self.assertEqual(os.path.getsize(written[0]["path"]), 44 + 44100 * 60 * 4)
+        self.assertLess(peak, 2**21)
+
+
+    def test_failed_read_leaves_no_partial_slice(self):
+        destination = os.path.join(self._tmp_dir.name, "out")
+        stream = AudioStream.from_raw(self.src, 44100, 2, buffer_duration=0.25)
+        num_buffers = [0]
+
+        def fail_on_tenth_buffer(buffer):
+            num_buffers[0] += 1
+            if num_buffers[0] == 10:
+                raise IOError("decode failed")
+        stream.add_listener(fail_on_tenth_buffer)
+
+        unraisable = []
+        previous_hook, sys.unraisablehook = sys.unraisablehook, unraisable.append
+        try:
+            with self.assertRaises(IOError):
+                split_stream_by_silence(stream, destination, source_name="track.pcm")
+            gc.collect()
+        finally:
+            sys.unraisablehook = previous_hook
+
+        self.assertEqual(unraisable, [])
+        self.assertEqual(os.listdir(destination), ["track_01.wav"])
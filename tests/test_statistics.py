@@ -0,0 +1,88 @@
+from smpl_tools.statistics import SliceStatistics, read_statistics_sidecar, write_statistics_sidecar
+import numpy as np
+import os
+import tempfile
+import unittest
+
+
+class SliceStatisticsTest(unittest.TestCase):
+
+
+    def _reference(self, signal, boundaries, num_channels):
+        frames = signal.reshape(-1, num_channels).astype(np.float64)
+        ends = boundaries[1:] + [frames.shape[0]]
+        results = []
+        for start, end in zip(boundaries, ends):
+            piece = frames[start:end]
+            results.append({
+                "start_ts":     start,
+                "duration_ts":  end - start,
+                "peak":         np.max(np.abs(piece)) / 2**15,
+                "rms":          np.sqrt(np.mean(piece**2)) / 2**15,
+                "dc_offset":    np.mean(piece) / 2**15,
+                "clipped":      int(np.sum(np.abs(piece) >= 2**15 - 1))
+            })
+        return results
+
+
+    def _run(self, signal, boundaries, num_channels, buffer_frames, lag):
+        statistics = SliceStatistics(2**15, 44100, num_channels)
+        fed = 0
+        total_frames = signal.size // num_channels
+        while fed < total_frames:
+            chunk = signal[fed * num_channels:(fed + buffer_frames) * num_channels]
+            statistics.feed(chunk)
+            fed += chunk.size // num_channels
+            # boundaries become known some time after the audio is fed
+            statistics.add_boundaries([b for b in boundaries if b < fed - lag])
+            statistics.advance(fed - lag)
+        statistics.add_boundaries(boundaries)
+        return statistics.finish()
+
+
+    def _assert_matches(self, signal, boundaries, num_channels=1, buffer_frames=1000, lag=0):
+        results = self._run(signal, boundaries, num_channels, buffer_frames, lag)
+        expected = self._reference(signal, boundaries, num_channels)
+        self.assertEqual(len(results), len(expected))
+        for result, reference in zip(results, expected):
+            for key, value in reference.items():
+                self.assertAlmostEqual(result[key], value, places=9, msg=key)
+
+
+    def test_matches_reference_for_random_buffers(self):
+        rng = np.random.default_rng(1)
+        signal = rng.integers(-2**15, 2**15, 20000).astype(np.int16)
+        signal[500:520] = 2**15 - 1
+        boundaries = [3, 500, 501, 7777, 19999]
+        for buffer_frames in (1, 7, 1000, 30000):
+            self._assert_matches(signal, boundaries, buffer_frames=buffer_frames)
+            self._assert_matches(signal, boundaries, buffer_frames=buffer_frames, lag=2500)
+
+
+    def test_interleaved_channels(self):
+        rng = np.random.default_rng(2)
+        signal = rng.integers(-2**15, 2**15, 2 * 9000).astype(np.int16)
+        self._assert_matches(signal, [0, 4000, 4001], num_channels=2, buffer_frames=333, lag=100)
+
+
+    def test_samples_before_first_slice_ignored(self):
+        signal = np.zeros(100, dtype=np.int16)
+        signal[:50] = 2**14
+        results = self._run(signal, [50], 1, 10, 0)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["peak"], 0)
+        self.assertEqual(results[0]["duration_ts"], 50)
+
+
+    def test_sidecar_roundtrip(self):
+        records = [
+            {"source": "a.wav", "path": "x.wav", "start_ts": 0, "end_ts": 10, "peak_db": float("-inf")},
+            {"source": "a.wav", "path": "y.wav", "start_ts": 10, "end_ts": 20, "peak_db": -3.0}
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, "stats.json")
+            write_statistics_sidecar(filename, records)
+            columns = read_statistics_sidecar(filename)
+        self.assertEqual(columns["path"], ["x.wav", "y.wav"])
+        self.assertEqual(columns["peak_db"], [None, -3.0])
+        self.assertEqual(columns["rms"], [None, None])
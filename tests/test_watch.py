@@ -0,0 +1,137 @@
+from smpl_tools.watch import WatchFolder, STATE_FILENAME, _process_track
+from smpl_tools import ffmpeg
+from unittest import mock
+import json
+import os
+import signal
+import tempfile
+import time
+import unittest
+
+
+def _hold_budget_slot(seconds):
+    with ffmpeg.get_process_budget():
+        time.sleep(seconds)
+
+
+def _budget_slot_free():
+    semaphore = ffmpeg.get_process_budget()._semaphore
+    if semaphore.acquire(False):
+        semaphore.release()
+        return True
+    return False
+
+
+class WatchFolderTest(unittest.TestCase):
+
+
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.source_dir = os.path.join(self._tmp_dir.name, "rips")
+        self.destination_dir = os.path.join(self._tmp_dir.name, "out")
+        os.makedirs(self.source_dir)
+        self.batch_filename = os.path.join(self._tmp_dir.name, "job.json")
+        with open(self.batch_filename, "w") as json_file:
+            json.dump([
+                {"source": "Track 01.wav", "sample_names": ["Alpha.wav"]},
+                {"source": "Track 02", "sample_names": ["Beta.wav"]}
+            ], json_file)
+
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+
+    def _make_watcher(self):
+        return WatchFolder(
+            self.batch_filename,
+            self.source_dir,
+            self.destination_dir,
+            settle_time=2
+        )
+
+
+    def _write_track(self, filename, content=b"RIFF"):
+        path = os.path.join(self.source_dir, filename)
+        with open(path, "ab") as track_file:
+            track_file.write(content)
+        return os.path.abspath(path)
+
+
+    def test_entries_matched_with_and_without_extension(self):
+        watcher = self._make_watcher()
+        self.assertEqual(watcher.match_entry("track 01.wav")["source"], "Track 01.wav")
+        self.assertEqual(watcher.match_entry("Track 02.wav")["source"], "Track 02")
+        self.assertIsNone(watcher.match_entry("Track 03.wav"))
+
+
+    def test_file_ready_only_after_settle_time(self):
+        watcher = self._make_watcher()
+        path = self._write_track("Track 01.wav")
+        self._write_track("unrelated.wav")
+        self.assertEqual(watcher.scan(now=0), [])
+        self.assertEqual(watcher.scan(now=1), [])
+        ready = watcher.scan(now=2)
+        self.assertEqual([p for p, _ in ready], [path])
+
+
+    def test_growing_file_restarts_settle_timer(self):
+        watcher = self._make_watcher()
+        self._write_track("Track 01.wav")
+        watcher.scan(now=0)
+        self._write_track("Track 01.wav", b"more data")
+        self.assertEqual(watcher.scan(now=2), [])
+        self.assertEqual(len(watcher.scan(now=4)), 1)
+
+
+    def test_processed_files_skipped_after_restart(self):
+        watcher = self._make_watcher()
+        path = self._write_track("Track 01.wav")
+        watcher.scan(now=0)
+        (_, signature), = watcher.scan(now=2)
+        watcher._processed[path] = signature
+        watcher._save_state()
+        self.assertTrue(os.path.isfile(os.path.join(self.destination_dir, STATE_FILENAME)))
+
+        restarted = self._make_watcher()
+        restarted.scan(now=0)
+        self.assertEqual(restarted.scan(now=2), [])
+
+
+    def test_workers_leave_ctrl_c_to_the_parent(self):
+        with self._make_watcher() as watcher:
+            handler = watcher._executor.submit(signal.getsignal, signal.SIGINT).result()
+        self.assertEqual(handler, signal.SIG_IGN)
+
+
+    def test_track_named_from_entry_not_from_file(self):
+        watcher = self._make_watcher()
+        path = self._write_track("track 01.wav")
+        entry = watcher.match_entry(path)
+        with mock.patch("smpl_tools.actions.split_file_by_silence", return_value=[
+            {"index": 0, "path": "Alpha.wav"}
+        ]) as split:
+            records = _process_track(entry, path, "out/%(trck)/%(smpl).wav")
+        self.assertEqual(split.call_args.args[0], path)
+        self.assertEqual(split.call_args.args[1], ["out/Track 01/Alpha.wav"])
+        self.assertEqual(records[0]["track"], "Track 01.wav")
+
+
+    def test_workers_share_one_process_budget(self):
+        previous = ffmpeg.get_process_budget()
+        ffmpeg.set_max_processes(1)
+        try:
+            watcher = WatchFolder(
+                self.batch_filename,
+                self.source_dir,
+                self.destination_dir,
+                num_workers=2
+            )
+            with watcher:
+                holding = watcher._executor.submit(_hold_budget_slot, 1)
+                time.sleep(0.3)
+                slot_free = watcher._executor.submit(_budget_slot_free).result()
+                holding.result()
+        finally:
+            ffmpeg._process_budget = previous
+        self.assertFalse(slot_free)